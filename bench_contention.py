@@ -0,0 +1,182 @@
+"""Measure write/read contention between processes sharing one SQLite file.
+
+Starts writer and reader processes, each importing the app like a gunicorn
+worker would, and runs them against the same database for a fixed time.
+Writers book appointments through book_appointment and add invoices, so the
+rollup triggers fire; readers load doctor schedules and the revenue report.
+This runs once per pragma profile on its own copy of the database:
+
+    tuned    the app's SQLITE_PRAGMAS (WAL, busy_timeout, synchronous=NORMAL)
+    default  SQLite's rollback journal with Python's 5 s busy timeout
+
+and prints throughput, latency and "database is locked" errors per role.
+
+    python bench_contention.py --writers 2 --readers 4 --seconds 10
+"""
+import argparse
+import logging
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DEFAULT_PROFILE = {'foreign_keys': 'ON', 'journal_mode': 'DELETE', 'synchronous': 'FULL'}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=2)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--doctors', type=int, default=20)
+    parser.add_argument('--visits', type=int, default=5)
+    parser.add_argument('--profiles', nargs='+', choices=['tuned', 'default'], default=['default', 'tuned'])
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+def use_database(path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(path)}'
+    os.environ['IDENTITY_CACHE_BACKEND'] = 'memory'
+    os.environ['DASHBOARD_CACHE_BACKEND'] = 'memory'
+    os.environ['PASSWORD_POOL_WORKERS'] = '0'
+
+
+def write(rng, doctors, patients, appointments):
+    from clinic import db, book_appointment, SLOT_MINUTES, Invoice
+
+    if rng.random() < 0.5:
+        day = datetime.today().date() + timedelta(days=rng.randint(1, 90))
+        start = datetime.combine(day, datetime.min.time()) + timedelta(minutes=SLOT_MINUTES * rng.randint(18, 33))
+        book_appointment(rng.randint(1, patients), rng.randint(1, doctors), start,
+                         start + timedelta(minutes=SLOT_MINUTES))
+    else:
+        db.session.add(Invoice(appointment_id=rng.randint(1, appointments), service_id=1, amount_cents=5000,
+                               payment_status='pending'))
+        db.session.commit()
+
+
+def read(rng, doctors):
+    import billing
+    from clinic import db, load_schedules
+
+    if rng.random() < 0.5:
+        start = datetime.combine(datetime.today().date(), datetime.min.time())
+        load_schedules(rng.sample(range(1, doctors + 1), 5), start, start + timedelta(days=7))
+    else:
+        billing.revenue_report(db.session, 'doctor_id')
+
+
+def worker(role, path, profile, seconds, seed, sizes, ready, go, results):
+    """One process: import the app, apply ``profile`` to fresh connections, run until the deadline."""
+    use_database(path)
+    from sqlalchemy.exc import OperationalError
+    from clinic import app, db
+
+    app.config['SQLITE_PRAGMAS'] = profile
+    # Waiting on a lock makes many statements "slow"; the table reports that.
+    logging.getLogger('metrics').setLevel(logging.ERROR)
+    with app.app_context():
+        # Connections opened while importing used the app's own pragmas.
+        db.engine.dispose()
+    ready.wait()
+    go.wait()
+
+    rng = random.Random(seed)
+    doctors, patients, appointments = sizes
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        with app.app_context():
+            try:
+                if role == 'writer':
+                    write(rng, doctors, patients, appointments)
+                else:
+                    read(rng, doctors)
+            except OperationalError as exc:
+                if 'locked' not in str(exc):
+                    raise
+                errors += 1
+                db.session.rollback()
+                continue
+            finally:
+                db.session.remove()
+        latencies.append(time.perf_counter() - started)
+    results.put((role, len(latencies), errors, latencies))
+
+
+def run_profile(name, path, profile, args, sizes):
+    context = multiprocessing.get_context('spawn')
+    roles = ['writer'] * args.writers + ['reader'] * args.readers
+    ready = context.Barrier(len(roles) + 1)
+    go = context.Barrier(len(roles) + 1)
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(role, path, profile, args.seconds, args.seed + i, sizes,
+                                                      ready, go, results))
+                 for i, role in enumerate(roles)]
+    for process in processes:
+        process.start()
+    # A worker that dies before reporting would otherwise hang the run.
+    timeout = args.seconds + 300
+    ready.wait(timeout)
+    # Every worker has closed its connections, so the journal mode can change.
+    with sqlite3.connect(path) as connection:
+        connection.execute(f"PRAGMA journal_mode = {profile['journal_mode']}")
+    go.wait(timeout)
+    collected = [results.get(timeout=timeout) for _ in processes]
+    for process in processes:
+        process.join()
+
+    for role in ('writer', 'reader'):
+        rows = [row for row in collected if row[0] == role]
+        if not rows:
+            continue
+        ops = sum(row[1] for row in rows)
+        errors = sum(row[2] for row in rows)
+        latencies = sorted(latency for row in rows for latency in row[3]) or [0]
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+        print(f'{name:<8} {role:<7} {len(rows):>5} {ops / args.seconds:>9.1f} '
+              f'{statistics.median(latencies) * 1000:>8.1f} {p95 * 1000:>8.1f} {errors:>7}')
+
+
+def main():
+    args = parse_args()
+    directory = tempfile.mkdtemp()
+    seed_path = os.path.join(directory, 'seed.db')
+    use_database(seed_path)
+
+    from clinic import (app, db, Account, Patient, Doctor, Appointment, MedicalRecord, Prescription,
+                        Service, Invoice)
+    import loadtest
+
+    started = time.perf_counter()
+    with app.app_context():
+        models = (Account, Patient, Doctor, Appointment, MedicalRecord, Prescription, Service, Invoice)
+        loadtest.generate(db, models, args.patients, args.doctors, args.visits, '', random.Random(args.seed))
+        db.session.execute(db.text('PRAGMA wal_checkpoint(TRUNCATE)'))
+        db.session.remove()
+        db.engine.dispose()
+    print(f'Generated {args.patients} patients in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+
+    sizes = (args.doctors, args.patients, args.patients * args.visits)
+    print(f'{"profile":<8} {"role":<7} {"procs":>5} {"ops/s":>9} {"p50 ms":>8} {"p95 ms":>8} {"locked":>7}')
+    profiles = {'tuned': dict(app.config['SQLITE_PRAGMAS']), 'default': DEFAULT_PROFILE}
+    for run, name in enumerate(args.profiles):
+        profile = profiles[name]
+        # A fresh name per run: a WAL left beside a reused name would be
+        # replayed into the new copy.
+        path = os.path.join(directory, f'{run}-{name}.db')
+        shutil.copy(seed_path, path)
+        run_profile(name, path, profile, args, sizes)
+
+
+if __name__ == '__main__':
+    main()
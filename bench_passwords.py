@@ -0,0 +1,118 @@
+"""Compare login throughput with inline and pooled password hashing.
+
+Several threads log in through the Flask test client while another thread
+keeps hitting a cheap page, standing in for the other requests a gunicorn
+worker has to serve during a login burst.
+
+    python bench_passwords.py --threads 8 --logins 200 --workers 0 2 4
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='SQLite file to use (default: a new temporary file)')
+    parser.add_argument('--method', default='pbkdf2:sha256:600000', help='Werkzeug hash method')
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 2, 4],
+                        help='Pool sizes to compare; 0 hashes inline')
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent login threads')
+    parser.add_argument('--logins', type=int, default=100, help='Logins per run')
+    return parser.parse_args()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+def run(app, accounts, threads, logins):
+    """Return (elapsed, login latencies, cheap-request latencies)."""
+    login_times, page_times = [], []
+    next_login = iter(range(logins))
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def log_in():
+        client = app.test_client()
+        while True:
+            with lock:
+                i = next(next_login, None)
+            if i is None:
+                return
+            started = time.perf_counter()
+            response = client.post('/', data={'email': accounts[i % len(accounts)], 'password': 'password',
+                                              'role': 'patient'})
+            login_times.append(time.perf_counter() - started)
+            if response.status_code != 302:
+                raise SystemExit(f'Login failed with {response.status_code}')
+            client.get('/logout')
+
+    def browse():
+        client = app.test_client()
+        while not done.is_set():
+            started = time.perf_counter()
+            client.get('/unauthorized').close()
+            page_times.append(time.perf_counter() - started)
+            time.sleep(0.005)
+
+    browser = threading.Thread(target=browse)
+    browser.start()
+    started = time.perf_counter()
+    workers = [threading.Thread(target=log_in) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    browser.join()
+    return elapsed, login_times, page_times
+
+
+def main():
+    args = parse_args()
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench_passwords.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(path)}'
+    os.environ['PASSWORD_HASH_METHOD'] = args.method
+    os.environ['IDENTITY_CACHE_BACKEND'] = 'memory'
+    os.environ['DASHBOARD_CACHE_BACKEND'] = 'memory'
+
+    from sqlalchemy import insert
+    import clinic
+    from clinic import app, db, Account
+    from passwords import PasswordHasher
+
+    accounts = [f'patient{i}@example.com' for i in range(args.threads * 4)]
+    with app.app_context():
+        password_hash = clinic.password_hasher.hash('password')
+        db.session.execute(insert(Account), [
+            dict(account_id=i + 1, firstname=f'f{i}', lastname=f'l{i}', email=email, phone='',
+                 birthdate='1990-01-01', password=password_hash, role='patient')
+            for i, email in enumerate(accounts)])
+        db.session.commit()
+    clinic.password_hasher.shutdown()
+
+    print(f'{args.logins} logins, {args.threads} threads, method {args.method}')
+    print(f'{"mode":<10} {"logins/s":>9} {"login p50":>10} {"login p95":>10} {"page p50":>9} {"page p95":>9}')
+    for workers in args.workers:
+        hasher = PasswordHasher(args.method, workers=workers, max_pending=max(args.threads, 16), timeout=60)
+        clinic.password_hasher = hasher
+        # One untimed login starts the pool's processes.
+        run(app, accounts, 1, 1)
+        elapsed, login_times, page_times = run(app, accounts, args.threads, args.logins)
+        hasher.shutdown()
+        mode = 'inline' if workers == 0 else f'pool={workers}'
+        print(f'{mode:<10} {args.logins / elapsed:>9.1f} '
+              f'{statistics.median(login_times) * 1000:>8.0f}ms {percentile(login_times, 0.95) * 1000:>8.0f}ms '
+              f'{statistics.median(page_times) * 1000:>7.1f}ms {percentile(page_times, 0.95) * 1000:>7.1f}ms')
+    print(f'Database left at {path}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
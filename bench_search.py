@@ -0,0 +1,114 @@
+"""Compare full-text record search with a LIKE scan on a generated corpus.
+
+The corpus comes from loadtest.generate (one medical record and one
+prescription per visit) plus a handful of records with a rare diagnosis.
+Each query is run through search.search_records and through the LIKE query
+a search page would need without the index. A LIKE page on a common term
+can stop after the first few index rows it reads; rare and absent terms
+have to scan the whole table.
+
+    python bench_search.py --patients 200000 --visits 5
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+QUERIES = ['gingivitis', 'amoxicillin', 'tooth abscess', 'erosion ibuprofen', 'osteonecrosis', 'xerostomia']
+RARE_DIAGNOSIS = 'osteonecrosis'
+
+LIKE_SQL = """
+    SELECT r.record_id, r.visit_date, r.diagnosis
+    FROM medical_record r
+    WHERE {clauses}
+    ORDER BY r.visit_date DESC, r.record_id DESC
+    LIMIT :limit
+"""
+
+# A record matches a term when its diagnosis, notes or any prescription does.
+LIKE_TERM = """(r.diagnosis LIKE :{name} OR r.notes LIKE :{name}
+    OR EXISTS (SELECT 1 FROM prescription p WHERE p.record_id = r.record_id AND p.medication_name LIKE :{name}))"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='SQLite file to use; an existing one is reused as the corpus')
+    parser.add_argument('--patients', type=int, default=200_000)
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--visits', type=int, default=5, help='Records per patient')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query')
+    parser.add_argument('--limit', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+def like_search(session, query, limit, patient_id=None):
+    from sqlalchemy import text
+
+    params = {'limit': limit}
+    clauses = []
+    for i, word in enumerate(query.split()):
+        params[f't{i}'] = f'%{word}%'
+        clauses.append(LIKE_TERM.format(name=f't{i}'))
+    if patient_id is not None:
+        clauses.append('r.patient_id = :patient_id')
+        params['patient_id'] = patient_id
+    return session.execute(text(LIKE_SQL.format(clauses=' AND '.join(clauses))), params).all()
+
+
+def timed(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000, result
+
+
+def main():
+    args = parse_args()
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench_search.db')
+    reuse = os.path.exists(path)
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(path)}'
+    os.environ['IDENTITY_CACHE_BACKEND'] = 'memory'
+    os.environ['DASHBOARD_CACHE_BACKEND'] = 'memory'
+
+    from sqlalchemy import func, insert, select, text
+    from clinic import (app, db, Account, Patient, Doctor, Appointment, MedicalRecord, Prescription,
+                        Service, Invoice)
+    import loadtest
+    import search
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        if not reuse:
+            started = time.perf_counter()
+            models = (Account, Patient, Doctor, Appointment, MedicalRecord, Prescription, Service, Invoice)
+            loadtest.generate(db, models, args.patients, args.doctors, args.visits, '', rng)
+            db.session.execute(insert(MedicalRecord), [
+                dict(patient_id=rng.randint(1, args.patients), doctor_id=rng.randint(1, args.doctors),
+                     visit_date='2020-01-01', diagnosis=RARE_DIAGNOSIS, notes='referred to surgeon')
+                for _ in range(10)])
+            db.session.commit()
+            db.session.execute(text('ANALYZE'))
+            print(f'Generated corpus in {time.perf_counter() - started:.0f}s at {path}', file=sys.stderr)
+        records = db.session.scalar(select(func.count()).select_from(MedicalRecord))
+        patients = db.session.scalar(select(func.max(Patient.patient_id)))
+        print(f'{records} records')
+
+        print(f'{"query":<30} {"fts ms":>8} {"like ms":>9} {"speedup":>8}')
+        scoped = rng.randint(1, patients)
+        cases = [(query, None) for query in QUERIES] + [(query, scoped) for query in QUERIES[:2]]
+        for query, patient_id in cases:
+            fts_ms, _ = timed(lambda: search.search_records(db.session, query, patient_id=patient_id,
+                                                            limit=args.limit), args.repeat)
+            like_ms, _ = timed(lambda: like_search(db.session, query, args.limit, patient_id), args.repeat)
+            label = query if patient_id is None else f'{query} (patient {patient_id})'
+            print(f'{label:<30} {fts_ms:>8.1f} {like_ms:>9.1f} {like_ms / fts_ms:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
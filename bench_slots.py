@@ -0,0 +1,104 @@
+"""Time free-slot lookups while the appointment table grows.
+
+Appointments are added as history: each step extends the table further into
+the past while lookups ask for a week starting today, so a flat timing shows
+the (doctor_id, start) index keeps the scan to the requested window.
+
+    python bench_slots.py --sizes 10000 1000000 5000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='SQLite file to use (default: a new temporary file)')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 1_000_000, 5_000_000])
+    parser.add_argument('--doctors', type=int, default=200)
+    parser.add_argument('--lookups', type=int, default=200, help='Timed lookups per size')
+    parser.add_argument('--per-lookup', type=int, default=10, help='Doctors asked for in one lookup')
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+def grow(db, Appointment, rng, doctors, first_id, count, days_per_row):
+    """Insert ``count`` appointments, each further in the past than the last."""
+    from sqlalchemy import insert
+
+    today = datetime.combine(date.today(), datetime.min.time())
+    batch = []
+    for appointment_id in range(first_id, first_id + count):
+        # A week of future bookings, then ever older history.
+        days_back = int(appointment_id * days_per_row) - 7
+        start = today - timedelta(days=days_back) + timedelta(hours=rng.randint(9, 16),
+                                                              minutes=rng.choice((0, 30)))
+        batch.append(dict(appointment_id=appointment_id, patient_id=rng.randint(1, 1000),
+                          doctor_id=rng.randint(1, doctors), start=start,
+                          end=start + timedelta(minutes=30), status='scheduled'))
+        if len(batch) == 50_000:
+            db.session.execute(insert(Appointment), batch)
+            batch = []
+    if batch:
+        db.session.execute(insert(Appointment), batch)
+    db.session.commit()
+
+
+def main():
+    args = parse_args()
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'bench_slots.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(path)}'
+    os.environ['DASHBOARD_CACHE_BACKEND'] = 'memory'
+
+    from sqlalchemy import insert, text
+    from clinic import app, db, Account, Doctor, Patient, Appointment, load_schedules
+
+    rng = random.Random(args.seed)
+    with app.app_context():
+        db.session.execute(insert(Account), [
+            dict(account_id=i, firstname=f'f{i}', lastname=f'l{i}', email=f'{i}@example.com', phone='',
+                 birthdate='1990-01-01', password='', role='doctor' if i <= args.doctors else 'patient')
+            for i in range(1, args.doctors + 1001)])
+        db.session.execute(insert(Doctor), [
+            dict(doctor_id=i, first_name='Doc', last_name=str(i), specialization='Dentistry',
+                 contact_number='', account_id=i) for i in range(1, args.doctors + 1)])
+        db.session.execute(insert(Patient), [
+            dict(patient_id=i, first_name='Pat', last_name=str(i), birthdate='1990-01-01', gender='F',
+                 contact_number='', account_id=args.doctors + i) for i in range(1, 1001)])
+        db.session.commit()
+
+        # About 16 half-hour slots per doctor per day.
+        days_per_row = 1 / (args.doctors * 16)
+        window_start = datetime.combine(date.today(), datetime.min.time())
+        window_end = window_start + timedelta(days=7)
+
+        print(f'{"rows":>10} {"insert s":>9} {"median ms":>10} {"p95 ms":>8} {"intervals":>10}')
+        rows = 0
+        for size in sorted(args.sizes):
+            started = time.perf_counter()
+            grow(db, Appointment, rng, args.doctors, rows + 1, size - rows, days_per_row)
+            db.session.execute(text('ANALYZE'))
+            inserted = time.perf_counter() - started
+            rows = size
+
+            timings, intervals = [], 0
+            for _ in range(args.lookups):
+                doctor_ids = rng.sample(range(1, args.doctors + 1), args.per_lookup)
+                started = time.perf_counter()
+                schedules = load_schedules(doctor_ids, window_start, window_end)
+                timings.append(time.perf_counter() - started)
+                intervals += sum(len(schedule.starts) for schedule in schedules.values())
+            timings.sort()
+            print(f'{rows:>10} {inserted:>9.1f} {statistics.median(timings) * 1000:>10.2f} '
+                  f'{timings[int(len(timings) * 0.95)] * 1000:>8.2f} {intervals // args.lookups:>10}')
+            db.session.remove()
+    print(f'Database left at {path}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
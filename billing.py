@@ -0,0 +1,153 @@
+import re
+from decimal import Decimal
+
+from sqlalchemy import DDL, event, text
+
+ROLLUP_KEY = 'day, doctor_id, service_id, payment_status'
+
+# An optional sign, currency symbol or code, and an amount, in either order:
+# "$1,234.50", "-$5", "$-5", "PHP 500", "500 PHP". Commas must group
+# thousands and there are at most two decimals; anything else ("12,34",
+# "1.005") is rejected rather than guessed at.
+_MONEY = re.compile(r'^([-+]?)\s*(?:[A-Z]{3}\.?|[$\u20b1\u20ac\u00a3])?\s*([-+]?)\s*'
+                    r'((?:\d{1,3}(?:,\d{3})+|\d+)(?:\.\d{0,2})?|\.\d{1,2})\s*(?:[A-Z]{3})?$',
+                    re.IGNORECASE)
+
+
+def parse_cents(value):
+    """Convert a money string such as ``"$1,234.50"``, ``"-$5"`` or ``"PHP 500"`` to integer cents."""
+    cleaned = str(value).strip()
+    # Accounting style: "(5.00)" is a negative amount.
+    negative = cleaned.startswith('(') and cleaned.endswith(')')
+    if negative:
+        cleaned = cleaned[1:-1].strip()
+    match = _MONEY.match(cleaned)
+    if match is None or (match[1] and match[2]) or (negative and (match[1] or match[2])):
+        raise ValueError(f'Not a money amount: {value!r}')
+    cents = int(Decimal(match[3].replace(',', '')) * 100)
+    return -cents if negative or '-' in (match[1], match[2]) else cents
+
+
+def _apply_delta(select_sql):
+    """Add the (key..., count, cents) rows produced by ``select_sql`` to the rollup."""
+    return f"""INSERT INTO revenue_rollup ({ROLLUP_KEY}, invoice_count, amount_cents)
+        {select_sql}
+        ON CONFLICT ({ROLLUP_KEY}) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            amount_cents = amount_cents + excluded.amount_cents;"""
+
+
+def _drop_empty(keys_sql):
+    """Delete the rollup rows named by ``keys_sql`` once they count no invoices.
+
+    Only the keys a trigger touched are checked, so the delete is a primary
+    key lookup rather than a scan of the whole rollup.
+    """
+    return f"""DELETE FROM revenue_rollup WHERE invoice_count = 0
+        AND ({ROLLUP_KEY}) IN ({keys_sql});"""
+
+
+_ADD_NEW = _apply_delta(
+    """SELECT date(a.start), a.doctor_id, NEW.service_id, NEW.payment_status, 1, NEW.amount_cents
+        FROM appointment a WHERE a.appointment_id = NEW.appointment_id""")
+
+_REMOVE_OLD = _apply_delta(
+    """SELECT date(a.start), a.doctor_id, OLD.service_id, OLD.payment_status, -1, -OLD.amount_cents
+        FROM appointment a WHERE a.appointment_id = OLD.appointment_id""")
+
+_DROP_OLD_EMPTY = _drop_empty(
+    """SELECT date(a.start), a.doctor_id, OLD.service_id, OLD.payment_status
+        FROM appointment a WHERE a.appointment_id = OLD.appointment_id""")
+
+_OLD_APPOINTMENT_KEYS = """SELECT date(OLD.start), OLD.doctor_id, service_id, payment_status
+    FROM invoice WHERE appointment_id = OLD.appointment_id"""
+
+_REMOVE_OLD_APPOINTMENT = _apply_delta(
+    """SELECT date(OLD.start), OLD.doctor_id, service_id, payment_status, -count(*), -sum(amount_cents)
+        FROM invoice WHERE appointment_id = OLD.appointment_id GROUP BY service_id, payment_status""")
+
+ROLLUP_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS invoice_rollup_ai AFTER INSERT ON invoice BEGIN
+        {_ADD_NEW}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS invoice_rollup_au
+        AFTER UPDATE OF appointment_id, service_id, amount_cents, payment_status ON invoice BEGIN
+        {_REMOVE_OLD}
+        {_ADD_NEW}
+        {_DROP_OLD_EMPTY}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS invoice_rollup_ad AFTER DELETE ON invoice BEGIN
+        {_REMOVE_OLD}
+        {_DROP_OLD_EMPTY}
+    END""",
+    # Rescheduling or reassigning an appointment moves its invoices to another day/doctor.
+    f"""CREATE TRIGGER IF NOT EXISTS appointment_rollup_au AFTER UPDATE OF start, doctor_id ON appointment BEGIN
+        {_REMOVE_OLD_APPOINTMENT}
+        {_apply_delta('''SELECT date(NEW.start), NEW.doctor_id, service_id, payment_status, count(*), sum(amount_cents)
+            FROM invoice WHERE appointment_id = NEW.appointment_id GROUP BY service_id, payment_status''')}
+        {_drop_empty(_OLD_APPOINTMENT_KEYS)}
+    END""",
+    # Invoices left behind by a deleted appointment no longer join to it, so
+    # they drop out of the rollup with it.
+    f"""CREATE TRIGGER IF NOT EXISTS appointment_rollup_ad AFTER DELETE ON appointment BEGIN
+        {_REMOVE_OLD_APPOINTMENT}
+        {_drop_empty(_OLD_APPOINTMENT_KEYS)}
+    END""",
+]
+
+TRIGGER_NAMES = ['invoice_rollup_ai', 'invoice_rollup_au', 'invoice_rollup_ad', 'appointment_rollup_au',
+                 'appointment_rollup_ad']
+
+EXPECTED_SQL = f"""SELECT date(a.start) AS day, a.doctor_id, i.service_id, i.payment_status,
+        count(*) AS invoice_count, sum(i.amount_cents) AS amount_cents
+    FROM invoice i JOIN appointment a ON a.appointment_id = i.appointment_id
+    GROUP BY {ROLLUP_KEY}"""
+
+REBUILD_SQL = [
+    'DELETE FROM revenue_rollup',
+    f'INSERT INTO revenue_rollup ({ROLLUP_KEY}, invoice_count, amount_cents) {EXPECTED_SQL}',
+]
+
+# Rows present on one side but not the other, in a single set-based pass.
+DIFF_SQL = f"""WITH expected AS ({EXPECTED_SQL}),
+    actual AS (SELECT {ROLLUP_KEY}, invoice_count, amount_cents FROM revenue_rollup)
+    SELECT 'missing' AS problem, * FROM (SELECT * FROM expected EXCEPT SELECT * FROM actual)
+    UNION ALL
+    SELECT 'unexpected' AS problem, * FROM (SELECT * FROM actual EXCEPT SELECT * FROM expected)"""
+
+
+def install(metadata):
+    """Create the rollup triggers once create_all has made every table."""
+    for statement in ROLLUP_TRIGGERS:
+        event.listen(metadata, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def rebuild(session):
+    for statement in REBUILD_SQL:
+        session.execute(text(statement))
+    session.commit()
+
+
+def reconcile(session):
+    """Return the rollup rows that disagree with the raw invoice table."""
+    return session.execute(text(DIFF_SQL)).mappings().all()
+
+
+def revenue_report(session, dimension, first_day=None, last_day=None):
+    """Sum the rollup along one of its key columns."""
+    if dimension not in ROLLUP_KEY.split(', '):
+        raise ValueError(f'Unknown dimension: {dimension}')
+    clauses, params = [], {}
+    if first_day is not None:
+        clauses.append('day >= :first_day')
+        params['first_day'] = first_day.isoformat()
+    if last_day is not None:
+        clauses.append('day <= :last_day')
+        params['last_day'] = last_day.isoformat()
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+    rows = session.execute(text(f"""
+        SELECT {dimension} AS key, sum(invoice_count) AS invoices, sum(amount_cents) AS amount_cents
+        FROM revenue_rollup {where}
+        GROUP BY {dimension} ORDER BY {dimension}
+    """), params).mappings().all()
+    return [dict(row) for row in rows]
@@ -0,0 +1,166 @@
+import csv
+import json
+from datetime import date, datetime
+from itertools import islice
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line_no, row, error)`` for each record in a CSV or JSONL stream."""
+    if fmt == 'csv':
+        for line_no, row in enumerate(csv.DictReader(stream), start=2):
+            yield line_no, row, None
+        return
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as exc:
+            yield line_no, None, f'invalid JSON: {exc}'
+            continue
+        if not isinstance(row, dict):
+            yield line_no, None, 'expected a JSON object'
+            continue
+        yield line_no, row, None
+
+
+def chunked(iterable, size):
+    it = iter(iterable)
+    while chunk := list(islice(it, size)):
+        yield chunk
+
+
+def coerce_row(table, raw):
+    """Pick the table's columns out of ``raw`` and convert them to Python types.
+
+    A primary key given by the source is kept, so later files can refer to
+    the row by it; a missing one is left as NULL for SQLite to assign. An
+    empty string is a value for text columns (CSV has no other way to write
+    an empty note) and NULL for every other type.
+    """
+    row = {}
+    for column in table.columns:
+        value = raw.get(column.name)
+        python_type = column.type.python_type
+        if value == '' and python_type is not str:
+            value = None
+        if value is None:
+            if not column.nullable and not column.primary_key:
+                raise ValueError(f'missing {column.name}')
+            row[column.name] = None
+            continue
+        if python_type is int:
+            value = int(value)
+        elif python_type is datetime and isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        elif python_type is str:
+            value = str(value)
+        row[column.name] = value
+    return row
+
+
+def _missing_references(session, table, rows):
+    """Return the indexes of rows whose foreign keys point at nothing.
+
+    Each foreign key column is checked with a single IN query per chunk.
+    """
+    bad = {}
+    for fk in table.foreign_keys:
+        name = fk.parent.name
+        wanted = {row[name] for row in rows if row[name] is not None}
+        if not wanted:
+            continue
+        found = set(session.scalars(select(fk.column).where(fk.column.in_(wanted))))
+        for i, row in enumerate(rows):
+            if row[name] is not None and row[name] not in found:
+                bad[i] = f'unknown {name} {row[name]}'
+    return bad
+
+
+def import_rows(session, table, records, chunk_size=1000, resolve=None, on_error=None, on_progress=None,
+                on_insert=None):
+    """Insert ``(line_no, row, error)`` records into ``table`` in batches.
+
+    Rows that fail to parse, coerce or resolve are passed to ``on_error`` and
+    skipped. A chunk that violates a constraint is retried row by row so only
+    the offending rows are rejected. ``on_insert`` gets the rows of each
+    commit; Core inserts skip ORM events, so caches are cleared from there.
+    """
+    inserted = rejected = 0
+
+    def reject(line_no, reason):
+        nonlocal rejected
+        rejected += 1
+        if on_error is not None:
+            on_error(line_no, reason)
+
+    for chunk in chunked(records, chunk_size):
+        if resolve is not None:
+            resolve(session, [row for _, row, error in chunk if error is None])
+
+        lines, rows = [], []
+        for line_no, raw, error in chunk:
+            if error is not None:
+                reject(line_no, error)
+                continue
+            try:
+                rows.append(coerce_row(table, raw))
+            except (TypeError, ValueError) as exc:
+                reject(line_no, str(exc))
+                continue
+            lines.append(line_no)
+
+        missing = _missing_references(session, table, rows)
+        for i, reason in missing.items():
+            reject(lines[i], reason)
+        good = [(line_no, row) for i, (line_no, row) in enumerate(zip(lines, rows)) if i not in missing]
+
+        if good:
+            try:
+                session.execute(insert(table), [row for _, row in good])
+                session.commit()
+                inserted += len(good)
+                committed = [row for _, row in good]
+            except IntegrityError:
+                session.rollback()
+                committed = []
+                for line_no, row in good:
+                    try:
+                        session.execute(insert(table), [row])
+                        session.commit()
+                        inserted += 1
+                        committed.append(row)
+                    except IntegrityError as exc:
+                        session.rollback()
+                        reject(line_no, str(exc.orig))
+            if on_insert is not None and committed:
+                on_insert(committed)
+
+        if on_progress is not None:
+            on_progress(inserted, rejected)
+    return inserted, rejected
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serialisable')
+
+
+def jsonl_line(kind, row):
+    return json.dumps({'type': kind, **row}, default=_json_default) + '\n'
+
+
+def stream_table(session, table, kind, where=None, exclude=(), batch_size=1000):
+    """Yield JSONL lines for a table without loading it into memory."""
+    columns = [column for column in table.columns if column.name not in exclude]
+    stmt = select(*columns).order_by(*table.primary_key.columns)
+    if where is not None:
+        stmt = stmt.where(where)
+    result = session.execute(stmt.execution_options(yield_per=batch_size))
+    for row in result.mappings():
+        yield jsonl_line(kind, dict(row))
@@ -0,0 +1,151 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+
+class TTLCache:
+    """Bounded per-process LRU cache whose entries expire after ``ttl`` seconds."""
+
+    backend = 'memory'
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {'backend': self.backend, 'size': len(self), 'hits': self.hits, 'misses': self.misses}
+
+
+_sqlite_caches = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    # A sqlite3 connection must not be used on both sides of a fork; the
+    # child drops its inherited ones and opens its own on first use.
+    for cache in _sqlite_caches:
+        cache._local = threading.local()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class SQLiteCache:
+    """Cache shared by every worker process on the host, stored in a SQLite file.
+
+    Values must be JSON serialisable. Hit and miss counters are per process.
+    Each thread opens its own connection, and a forked child opens new ones
+    rather than sharing its parent's.
+    """
+
+    backend = 'sqlite'
+    prune_every = 256
+
+    def __init__(self, path, maxsize=10000, ttl=300):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._local = threading.local()
+        _sqlite_caches.add(self)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS cache '
+                         '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            'SELECT value FROM cache WHERE key = ? AND expires >= ?', (key, time.time())
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        expires = time.time() + (self.ttl if ttl is None else ttl)
+        conn = self._connect()
+        conn.execute('INSERT OR REPLACE INTO cache (key, value, expires) VALUES (?, ?, ?)',
+                     (key, json.dumps(value), expires))
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self._prune(conn)
+
+    def _prune(self, conn):
+        conn.execute('DELETE FROM cache WHERE expires < ?', (time.time(),))
+        conn.execute('DELETE FROM cache WHERE key IN '
+                     '(SELECT key FROM cache ORDER BY expires DESC LIMIT -1 OFFSET ?)',
+                     (self.maxsize,))
+
+    def delete(self, *keys):
+        if keys:
+            self._connect().executemany('DELETE FROM cache WHERE key = ?', [(k,) for k in keys])
+
+    def clear(self):
+        self._connect().execute('DELETE FROM cache')
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+
+    def stats(self):
+        return {'backend': self.backend, 'size': len(self), 'hits': self.hits, 'misses': self.misses}
+
+
+def make_cache(backend, path, maxsize, ttl):
+    if backend == 'sqlite':
+        return SQLiteCache(path, maxsize=maxsize, ttl=ttl)
+    if backend == 'memory':
+        return TTLCache(maxsize=maxsize, ttl=ttl)
+    raise ValueError(f'Unknown cache backend: {backend!r}')
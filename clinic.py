@@ -1,14 +1,140 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+import base64
+import hashlib
+import hmac
+import json
+import os
+import sqlite3
+import sys
+from bisect import bisect_right
+from contextlib import contextmanager
+from datetime import datetime, date, time, timedelta
+
+import click
+from flask import Blueprint, Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response, stream_with_context
+from flask_restx import Api, Resource, fields, marshal
+from flask_restx.mask import Mask, MaskError
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Integer, String, ForeignKey, Date
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from flask_migrate import Migrate, stamp
+from sqlalchemy import Integer, String, ForeignKey, Date, DateTime, Index, select, event, inspect, tuple_, func
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import (DeclarativeBase, Mapped, mapped_column, relationship, Session, object_session,
+                            contains_eager, joinedload, selectinload)
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user, UserMixin
-from werkzeug.security import check_password_hash, generate_password_hash
+
+from bulk import import_rows, read_rows, stream_table
+from cache import make_cache
+import billing
+import metrics
+import search
+from passwords import PasswordHasher, HasherBusy
+
+
+def pool_options(url, **options):
+    """Return ``options`` unless ``url`` is an in-memory SQLite database.
+
+    SQLAlchemy gives in-memory SQLite a single shared connection
+    (StaticPool), which rejects pool sizing arguments.
+    """
+    url = make_url(url)
+    if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+        return {}
+    return options
+
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'wowixczzzzz'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///fernandez_clinic.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///fernandez_clinic.db')
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = pool_options(
+    app.config['SQLALCHEMY_DATABASE_URI'], pool_size=10, max_overflow=5, pool_timeout=10)
+# Applied to every new SQLite connection. WAL lets readers run alongside the
+# single writer, and busy_timeout makes writers wait instead of failing with
+# "database is locked". SQLite leaves foreign keys unenforced unless asked.
+app.config['SQLITE_PRAGMAS'] = {
+    'foreign_keys': 'ON',
+    'journal_mode': 'WAL',
+    'busy_timeout': 5000,
+    'synchronous': 'NORMAL',
+    'cache_size': -20000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+# Optional separate engine for reporting queries, e.g. a read-only handle on
+# the same file: sqlite:///file:/path/to/fernandez_clinic.db?mode=ro&uri=true
+if os.environ.get('REPORTING_DATABASE_URL'):
+    app.config['SQLALCHEMY_BINDS'] = {
+        'reporting': {'url': os.environ['REPORTING_DATABASE_URL'],
+                      **pool_options(os.environ['REPORTING_DATABASE_URL'], pool_size=5)},
+    }
+# "sqlite" shares the cache between gunicorn workers, so a role change made
+# through one worker is seen by all of them. "memory" is per worker and only
+# safe with a single worker process. See cache_location() for the file.
+app.config['IDENTITY_CACHE_BACKEND'] = os.environ.get('IDENTITY_CACHE_BACKEND', 'sqlite')
+app.config['IDENTITY_CACHE_SIZE'] = 1024
+app.config['IDENTITY_CACHE_TTL'] = 300
+# Stored hashes made with a different method are upgraded on the next login.
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+app.config['PASSWORD_POOL_WORKERS'] = int(os.environ.get('PASSWORD_POOL_WORKERS', 2))
+app.config['PASSWORD_POOL_MAX_PENDING'] = 16
+app.config['PASSWORD_HASH_TIMEOUT'] = 5.0
+# Dashboards default to the shared backend so a change made through one
+# worker is not served stale by another.
+app.config['DASHBOARD_CACHE_BACKEND'] = os.environ.get('DASHBOARD_CACHE_BACKEND', 'sqlite')
+app.config['DASHBOARD_CACHE_SIZE'] = 5000
+app.config['DASHBOARD_CACHE_TTL'] = 120
+app.config['DASHBOARD_WARM_ON_STARTUP'] = True
+app.config['API_PAGE_SIZE'] = 50
+app.config['API_MAX_PAGE_SIZE'] = 200
+# Searches outside a patient's chart rank only this many of the newest matches.
+app.config['SEARCH_MAX_CANDIDATES'] = 1000
+app.config['METRICS_SLOW_QUERY_SECONDS'] = 0.1
+# Adds a Server-Timing header with request and SQL time to every response.
+app.config['METRICS_DEBUG_HEADER'] = os.environ.get('METRICS_DEBUG_HEADER') == '1'
+# "sqlite" sums the metrics of every worker process (see metrics.SharedStore),
+# so a scrape answered by any gunicorn worker covers all of them.
+app.config['METRICS_BACKEND'] = os.environ.get('METRICS_BACKEND', 'sqlite')
+# Scrapers send "Authorization: Bearer <token>" (or ?token=). Without a
+# token configured /metrics is not served at all.
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
 db = SQLAlchemy(app)
+migrate = Migrate(app, db, directory=os.path.join(app.root_path, 'migrations'))
+# Schema of databases created before Flask-Migrate was added.
+BASELINE_REVISION = 'a0da174be287'
+instrumentation = metrics.Instrumentation(app)
+
+password_hasher = PasswordHasher(app.config['PASSWORD_HASH_METHOD'],
+                                 workers=app.config['PASSWORD_POOL_WORKERS'],
+                                 max_pending=app.config['PASSWORD_POOL_MAX_PENDING'],
+                                 timeout=app.config['PASSWORD_HASH_TIMEOUT'])
+
+
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        try:
+            cursor.execute(f'PRAGMA {name} = {value}')
+        except sqlite3.OperationalError:
+            # Read-only connections cannot switch the journal mode.
+            pass
+    cursor.close()
+
+
+@contextmanager
+def reporting_session():
+    """Session for read-only reporting queries.
+
+    Uses the "reporting" bind when one is configured, otherwise the main session.
+    """
+    if 'reporting' not in app.config.get('SQLALCHEMY_BINDS', {}):
+        yield db.session
+        return
+    with Session(db.engines['reporting']) as session:
+        yield session
+
 
 login_manager = LoginManager()
 login_manager.login_view = 'login'
@@ -55,12 +181,22 @@ class Appointment(db.Model):
     __tablename__ = "appointment"
 
     appointment_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    patient_id: Mapped[int] = mapped_column(ForeignKey("patient.patient_id"))
-    doctor_id: Mapped[int] = mapped_column(ForeignKey("doctor.doctor_id"))
-    appointment_date: Mapped[str] = mapped_column(String(10))
-    appointment_time: Mapped[str] = mapped_column(String(10)) 
+    # active_history keeps the old values around so dashboard invalidation
+    # can find the schedule an appointment moved away from.
+    patient_id: Mapped[int] = mapped_column(ForeignKey("patient.patient_id"), active_history=True)
+    doctor_id: Mapped[int] = mapped_column(ForeignKey("doctor.doctor_id"), active_history=True)
+    start: Mapped[datetime] = mapped_column(DateTime, active_history=True)
+    end: Mapped[datetime] = mapped_column(DateTime)
     status: Mapped[str] = mapped_column(String(20))
 
+    # Slot lookups filter on one doctor and a start range; a patient's
+    # appointments are listed in start order; dashboards count by day.
+    __table_args__ = (
+        Index("ix_appointment_doctor_start", "doctor_id", "start"),
+        Index("ix_appointment_patient_start", "patient_id", "start"),
+        Index("ix_appointment_start", "start"),
+    )
+
     patient: Mapped["Patient"] = relationship(back_populates="appointments")
     doctor: Mapped["Doctor"] = relationship(back_populates="appointments")
     invoices: Mapped[list["Invoice"]] = relationship(back_populates="appointment")
@@ -70,9 +206,9 @@ class MedicalRecord(db.Model):
     __tablename__ = "medical_record"
 
     record_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    patient_id: Mapped[int] = mapped_column(ForeignKey("patient.patient_id"))
-    doctor_id: Mapped[int] = mapped_column(ForeignKey("doctor.doctor_id"))
-    visit_date: Mapped[str] = mapped_column(String(10))
+    patient_id: Mapped[int] = mapped_column(ForeignKey("patient.patient_id"), index=True, active_history=True)
+    doctor_id: Mapped[int] = mapped_column(ForeignKey("doctor.doctor_id"), index=True)
+    visit_date: Mapped[str] = mapped_column(String(10), index=True)
     diagnosis: Mapped[str] = mapped_column(String)
     notes: Mapped[str] = mapped_column(String)
 
@@ -85,7 +221,7 @@ class Prescription(db.Model):
     __tablename__ = "prescription"
 
     prescription_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    record_id: Mapped[int] = mapped_column(ForeignKey("medical_record.record_id"))
+    record_id: Mapped[int] = mapped_column(ForeignKey("medical_record.record_id"), index=True)
     medication_name: Mapped[str] = mapped_column(String(100))
     dosage: Mapped[str] = mapped_column(String(50))
     instructions: Mapped[str] = mapped_column(String)
@@ -99,23 +235,42 @@ class Service(db.Model):
     service_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(100))
     description: Mapped[str] = mapped_column(String)
-    fee: Mapped[str] = mapped_column(String(20))
+    fee_cents: Mapped[int] = mapped_column(Integer)
 
 
 class Invoice(db.Model):
     __tablename__ = "invoice"
 
     invoice_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    appointment_id: Mapped[int] = mapped_column(ForeignKey("appointment.appointment_id"))
-    service_id: Mapped[int] = mapped_column(ForeignKey("service.service_id"))
-    amount: Mapped[str] = mapped_column(String(20))  
+    appointment_id: Mapped[int] = mapped_column(ForeignKey("appointment.appointment_id"), index=True)
+    service_id: Mapped[int] = mapped_column(ForeignKey("service.service_id"), index=True)
+    amount_cents: Mapped[int] = mapped_column(Integer)
     payment_status: Mapped[str] = mapped_column(String(20))
 
     appointment: Mapped["Appointment"] = relationship(back_populates="invoices")
     service: Mapped["Service"] = relationship()
 
 
-class Account(db.Model):
+class RevenueRollup(db.Model):
+    """Invoice totals per day, doctor, service and payment status.
+
+    Maintained by triggers on invoice and appointment (see billing.py).
+    """
+    __tablename__ = "revenue_rollup"
+
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    doctor_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    service_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    payment_status: Mapped[str] = mapped_column(String(20), primary_key=True)
+    invoice_count: Mapped[int] = mapped_column(Integer, default=0)
+    amount_cents: Mapped[int] = mapped_column(Integer, default=0)
+
+
+search.install(Prescription.__table__)
+billing.install(db.metadata)
+
+
+class Account(db.Model, UserMixin):
     __tablename__ = "account"
     account_id: Mapped[int] = mapped_column(Integer, primary_key=True)
     firstname: Mapped[str] = mapped_column(String(50), unique=True)
@@ -123,7 +278,7 @@ class Account(db.Model):
     email: Mapped[str] = mapped_column(String(100), unique=True)
     phone: Mapped[str] = mapped_column(String(20))
     birthdate: Mapped[str] = mapped_column(String(10))
-    password: Mapped[str] = mapped_column(String(100))
+    password: Mapped[str] = mapped_column(String(255))
     role: Mapped[str] = mapped_column(String(20)) 
 
     patient = relationship("Patient", back_populates="account", uselist=False)
@@ -132,21 +287,567 @@ class Account(db.Model):
     def get_id(self):
         return str(self.account_id)
 
+# ---------------------------------------------------------------------------
+# Scheduling
+# ---------------------------------------------------------------------------
+
+SLOT_MINUTES = 30
+MAX_APPOINTMENT_MINUTES = 120
+CLINIC_OPEN = time(9, 0)
+CLINIC_CLOSE = time(17, 0)
+INACTIVE_STATUSES = ('cancelled',)
+
+
+class DoctorSchedule:
+    """Busy intervals for a single doctor, used for conflict checks.
+
+    Overlapping and touching intervals are merged as they are added, so the
+    intervals stay disjoint and sorted and only the one starting at or before
+    a time can cover it. Without merging, [09:00-11:00] would hide a later
+    check behind [09:30-10:00].
+    """
+
+    __slots__ = ('starts', 'ends')
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+
+    def add(self, start, end):
+        i = bisect_right(self.starts, start)
+        if i and self.ends[i - 1] >= start:
+            i -= 1
+            start = self.starts[i]
+        j = i
+        while j < len(self.starts) and self.starts[j] <= end:
+            end = max(end, self.ends[j])
+            j += 1
+        self.starts[i:j] = [start]
+        self.ends[i:j] = [end]
+
+    def overlaps(self, start, end):
+        i = bisect_right(self.starts, start)
+        if i and self.ends[i - 1] > start:
+            return True
+        return i < len(self.starts) and self.starts[i] < end
+
+    def free_slots(self, day, length=timedelta(minutes=SLOT_MINUTES)):
+        slots = []
+        slot = datetime.combine(day, CLINIC_OPEN)
+        close = datetime.combine(day, CLINIC_CLOSE)
+        while slot + length <= close:
+            if not self.overlaps(slot, slot + length):
+                slots.append(slot)
+            slot += length
+        return slots
+
+
+def load_schedules(doctor_ids, window_start, window_end):
+    """Fetch busy intervals for many doctors in one indexed query."""
+    schedules = {doctor_id: DoctorSchedule() for doctor_id in doctor_ids}
+    if not schedules:
+        return schedules
+    # Bounding start from below keeps the scan on ix_appointment_doctor_start.
+    earliest = window_start - timedelta(minutes=MAX_APPOINTMENT_MINUTES)
+    rows = db.session.execute(
+        select(Appointment.doctor_id, Appointment.start, Appointment.end)
+        .where(Appointment.doctor_id.in_(schedules))
+        .where(Appointment.start >= earliest)
+        .where(Appointment.start < window_end)
+        .where(Appointment.status.not_in(INACTIVE_STATUSES))
+        .order_by(Appointment.doctor_id, Appointment.start)
+    )
+    for doctor_id, start, end in rows:
+        if end > window_start:
+            schedules[doctor_id].add(start, end)
+    return schedules
+
+
+def check_bookable(doctor_id, start, end):
+    """Raise ValueError unless ``start``-``end`` is a future slot in clinic hours with a known doctor."""
+    if start.tzinfo is not None or end.tzinfo is not None:
+        raise ValueError('Times must be local clinic time without a UTC offset')
+    if end <= start:
+        raise ValueError('Appointment must end after it starts')
+    if start < datetime.now():
+        raise ValueError('Appointment start is in the past')
+    opening = datetime.combine(start.date(), CLINIC_OPEN)
+    if start < opening or end > datetime.combine(start.date(), CLINIC_CLOSE):
+        raise ValueError(f'Appointments must fall between {CLINIC_OPEN:%H:%M} and {CLINIC_CLOSE:%H:%M}')
+    slot = timedelta(minutes=SLOT_MINUTES)
+    if (start - opening) % slot or (end - start) % slot:
+        raise ValueError(f'Appointments must start and end on the {SLOT_MINUTES}-minute slot grid')
+    if db.session.get(Doctor, doctor_id) is None:
+        raise ValueError(f'Unknown doctor {doctor_id}')
+
+
+def book_appointment(patient_id, doctor_id, start, end):
+    """Insert an appointment unless it overlaps one the doctor already has.
+
+    Raises ValueError (see check_bookable) for a slot that can never be
+    booked. The row is flushed before the conflict check so the write lock is
+    held for the rest of the transaction; concurrent bookings for the same
+    database serialise behind it instead of both passing the check.
+    """
+    check_bookable(doctor_id, start, end)
+    appointment = Appointment(patient_id=patient_id, doctor_id=doctor_id,
+                              start=start, end=end, status='scheduled')
+    db.session.add(appointment)
+    db.session.flush()
+
+    conflict = db.session.execute(
+        select(Appointment.appointment_id)
+        .where(Appointment.doctor_id == doctor_id)
+        .where(Appointment.appointment_id != appointment.appointment_id)
+        .where(Appointment.start >= start - timedelta(minutes=MAX_APPOINTMENT_MINUTES))
+        .where(Appointment.start < end)
+        .where(Appointment.end > start)
+        .where(Appointment.status.not_in(INACTIVE_STATUSES))
+        .limit(1)
+    ).first()
+    if conflict:
+        db.session.rollback()
+        return None
+
+    db.session.commit()
+    return appointment
+
+
+# ---------------------------------------------------------------------------
+# Bulk import / export
+# ---------------------------------------------------------------------------
+
+def _resolve_emails(session, rows, id_key, email_key, stmt):
+    """Fill ``id_key`` from ``email_key`` in one query; ``stmt`` selects (email, id) pairs."""
+    emails = {row[email_key] for row in rows if not row.get(id_key) and row.get(email_key)}
+    if not emails:
+        return
+    ids = dict(session.execute(stmt.where(Account.email.in_(emails))).all())
+    for row in rows:
+        if not row.get(id_key) and row.get(email_key) in ids:
+            row[id_key] = ids[row[email_key]]
+
+
+def _resolve_account_emails(session, rows):
+    _resolve_emails(session, rows, 'account_id', 'account_email', select(Account.email, Account.account_id))
+
+
+def _resolve_doctor_emails(session, rows):
+    _resolve_emails(session, rows, 'doctor_id', 'doctor_email',
+                    select(Account.email, Doctor.doctor_id).join(Doctor, Doctor.account_id == Account.account_id))
+
+
+IMPORTABLE = {
+    'patients': (Patient, _resolve_account_emails),
+    'records': (MedicalRecord, _resolve_doctor_emails),
+    'prescriptions': (Prescription, None),
+}
+
+@app.cli.command('import')
+@click.argument('kind', type=click.Choice(sorted(IMPORTABLE)))
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'jsonl']), default=None,
+              help='Defaults to the file extension.')
+@click.option('--chunk-size', default=1000, show_default=True)
+@click.option('--errors', type=click.File('w', encoding='utf-8'), default=None,
+              help='Write rejected rows here instead of stderr.')
+def import_rows_command(kind, source, fmt, chunk_size, errors):
+    """Import patients, records or prescriptions from SOURCE ("-" for stdin).
+
+    Ids in the source are kept, so records and prescriptions can point at
+    patients and records imported before them. account_email and
+    doctor_email may be given instead of account_id and doctor_id.
+    """
+    model, resolve = IMPORTABLE[kind]
+    fmt = fmt or ('csv' if source.name.endswith('.csv') else 'jsonl')
+    errors = errors or sys.stderr
+
+    def on_error(line_no, reason):
+        errors.write(f'{source.name}:{line_no}: {reason}\n')
+
+    def on_progress(inserted, rejected):
+        click.echo(f'{kind}: {inserted} inserted, {rejected} rejected', err=True)
+
+    def on_insert(rows):
+        # A newly linked patient would otherwise keep patient_id=None in the
+        # identity cache until the entry expires.
+        keys = {_identity_key(row['account_id']) for row in rows if row.get('account_id') is not None}
+        if keys:
+            identity_cache.delete(*keys)
+
+    inserted, rejected = import_rows(db.session, model.__table__, read_rows(source, fmt),
+                                     chunk_size=chunk_size, resolve=resolve,
+                                     on_error=on_error, on_progress=on_progress, on_insert=on_insert)
+    dashboard_cache.clear()
+    click.echo(f'Imported {inserted} {kind}; rejected {rejected}.')
+
+
+def export_chart(patient_id):
+    """Yield a patient's chart (profile, appointments, records, prescriptions, invoices) as JSONL."""
+    session = db.session
+    yield from stream_table(session, Patient.__table__, 'patient', Patient.patient_id == patient_id)
+    yield from stream_table(session, Appointment.__table__, 'appointment', Appointment.patient_id == patient_id)
+    yield from stream_table(session, MedicalRecord.__table__, 'medical_record', MedicalRecord.patient_id == patient_id)
+    record_ids = select(MedicalRecord.record_id).where(MedicalRecord.patient_id == patient_id)
+    yield from stream_table(session, Prescription.__table__, 'prescription', Prescription.record_id.in_(record_ids))
+    appointment_ids = select(Appointment.appointment_id).where(Appointment.patient_id == patient_id)
+    yield from stream_table(session, Invoice.__table__, 'invoice', Invoice.appointment_id.in_(appointment_ids))
+
+
+def export_database():
+    """Yield every table as JSONL, parents before children. Password hashes are left out."""
+    session = db.session
+    yield from stream_table(session, Account.__table__, 'account', exclude=('password',))
+    for model in (Patient, Doctor, Service, Appointment, MedicalRecord, Prescription, Invoice):
+        yield from stream_table(session, model.__table__, model.__tablename__)
+
+
+@app.cli.command('export')
+@click.option('--patient', 'patient_id', type=int, default=None, help='Export one patient chart.')
+@click.option('--output', type=click.File('w', encoding='utf-8'), default='-', show_default=True)
+def export_command(patient_id, output):
+    """Write a patient chart or the whole database as JSONL."""
+    lines = export_chart(patient_id) if patient_id is not None else export_database()
+    for line in lines:
+        output.write(line)
+
+
+@app.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Rebuild the full-text index over medical records and prescriptions."""
+    search.rebuild(db.session)
+    click.echo('Search index rebuilt.')
+
+
+@app.cli.command('reconcile-revenue')
+@click.option('--rebuild', is_flag=True, help='Recompute the rollup from the invoice table.')
+def reconcile_revenue_command(rebuild):
+    """Check the revenue rollup against the raw invoice table."""
+    if rebuild:
+        billing.rebuild(db.session)
+    problems = billing.reconcile(db.session)
+    for row in problems[:50]:
+        click.echo(', '.join(f'{key}={value}' for key, value in row.items()))
+    if problems:
+        raise click.ClickException(f'{len(problems)} rollup rows disagree with the invoice table; '
+                                   'run with --rebuild to fix them.')
+    click.echo('Revenue rollup matches the invoice table.')
+
+
+def _jsonl_download(lines, filename):
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson',
+                    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+
+# ---------------------------------------------------------------------------
+# Identity cache
+# ---------------------------------------------------------------------------
+
+def cache_location(backend, name):
+    """Return the ``(backend, path)`` for a shared cache of this app's database.
+
+    The file sits beside the database file, so a process using another
+    database (a load test, a restored copy) never writes entries the app
+    would trust. An in-memory database is private to its process, so its
+    cache is too; a server database gets a file named after its URL.
+    """
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'sqlite':
+        digest = hashlib.sha1(url.render_as_string(hide_password=False).encode()).hexdigest()[:12]
+        return backend, os.path.join(app.instance_path, f'{name}-{digest}.db')
+    if url.database in (None, '', ':memory:') or url.query.get('mode') == 'memory':
+        return 'memory', None
+    database = url.database
+    if url.query.get('uri') == 'true':
+        database = database.removeprefix('file:')
+    # Flask-SQLAlchemy resolves relative SQLite paths against the instance folder.
+    database = os.path.join(app.instance_path, database)
+    return backend, f'{os.path.splitext(database)[0]}.{name}.db'
+
+
+identity_cache = make_cache(*cache_location(app.config['IDENTITY_CACHE_BACKEND'], 'identity_cache'),
+                            app.config['IDENTITY_CACHE_SIZE'],
+                            app.config['IDENTITY_CACHE_TTL'])
+
+
+class Identity:
+    """Lightweight stand-in for Account that Flask-Login keeps as current_user."""
+
+    __slots__ = ('account_id', 'role', 'name', 'patient_id', 'doctor_id')
+
+    is_active = True
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, account_id, role, name, patient_id=None, doctor_id=None):
+        self.account_id = account_id
+        self.role = role
+        self.name = name
+        self.patient_id = patient_id
+        self.doctor_id = doctor_id
+
+    def get_id(self):
+        return str(self.account_id)
+
+
+def _identity_key(account_id):
+    return f'identity:{account_id}'
+
+
+def invalidate_after_commit(target, cache, *keys):
+    """Drop ``keys`` from ``cache`` once the session that flushed ``target`` commits.
+
+    Deleting at commit rather than flush keeps other requests from caching
+    rows that may still be rolled back.
+    """
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('stale_cache_keys', set()).update((cache, key) for key in keys)
+
+
+@event.listens_for(Session, 'after_commit')
+def _drop_stale_cache_keys(session):
+    stale = session.info.pop('stale_cache_keys', None)
+    if stale:
+        by_cache = {}
+        for cache, key in stale:
+            by_cache.setdefault(cache, []).append(key)
+        for cache, keys in by_cache.items():
+            cache.delete(*keys)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_stale_cache_keys(session):
+    session.info.pop('stale_cache_keys', None)
+
+
+def _mark_identity_dirty(mapper, connection, target):
+    if target.account_id is not None:
+        invalidate_after_commit(target, identity_cache, _identity_key(target.account_id))
+
+
+for _model in (Account, Patient, Doctor):
+    for _event in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_model, _event, _mark_identity_dirty)
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    return Account.query.get(int(user_id))
+    key = _identity_key(user_id)
+    row = identity_cache.get(key)
+    if row is None:
+        row = db.session.execute(
+            select(Account.account_id, Account.role,
+                   Account.firstname + ' ' + Account.lastname,
+                   Patient.patient_id, Doctor.doctor_id)
+            .outerjoin(Patient, Patient.account_id == Account.account_id)
+            .outerjoin(Doctor, Doctor.account_id == Account.account_id)
+            .where(Account.account_id == int(user_id))
+        ).first()
+        if row is None:
+            return None
+        row = tuple(row)
+        identity_cache.set(key, row)
+    return Identity(*row)
+
+
+# ---------------------------------------------------------------------------
+# Dashboard data
+# ---------------------------------------------------------------------------
+#
+# Aggregates are cached under keys naming exactly what they depend on, and
+# ORM events on Appointment, Invoice and MedicalRecord drop only the keys a
+# change touches. Bulk Core inserts bypass those events and fall back to the
+# TTL (the import command clears the cache itself).
+
+dashboard_cache = make_cache(*cache_location(app.config['DASHBOARD_CACHE_BACKEND'], 'dashboard_cache'),
+                             app.config['DASHBOARD_CACHE_SIZE'],
+                             app.config['DASHBOARD_CACHE_TTL'])
+
+
+_cache_counters = [
+    (cache,
+     metrics.Counter(f'{name}_cache_hits_total', f'{name.capitalize()} cache lookups that found an entry.'),
+     metrics.Counter(f'{name}_cache_misses_total', f'{name.capitalize()} cache lookups that did not.'))
+    for name, cache in (('identity', identity_cache), ('dashboard', dashboard_cache))
+]
+
+
+@metrics.before_collect
+def _copy_cache_counters():
+    for cache, hits, misses in _cache_counters:
+        hits.set(cache.hits)
+        misses.set(cache.misses)
+
+
+_metrics_backend, _metrics_path = cache_location(app.config['METRICS_BACKEND'], 'metrics')
+if _metrics_backend == 'sqlite':
+    instrumentation.share(_metrics_path)
+
+
+def _admin_key(day):
+    return f'dash:admin:{day.isoformat()}'
+
+
+def _schedule_key(doctor_id, day):
+    return f'dash:doctor:{doctor_id}:{day.isoformat()}'
+
+
+def _patient_key(patient_id):
+    return f'dash:patient:{patient_id}'
+
+
+def _cached(key, compute):
+    value = dashboard_cache.get(key)
+    if value is None:
+        value = compute()
+        dashboard_cache.set(key, value)
+    return value
+
+
+def _day_bounds(day):
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+def admin_stats(day=None):
+    day = day or date.today()
+
+    def compute():
+        start, end = _day_bounds(day)
+        pending = RevenueRollup.payment_status == 'pending'
+        row = db.session.execute(select(
+            select(func.count()).select_from(Patient).scalar_subquery(),
+            select(func.count()).select_from(Doctor).scalar_subquery(),
+            select(func.count()).select_from(Appointment)
+            .where(Appointment.start >= start, Appointment.start < end).scalar_subquery(),
+            select(func.coalesce(func.sum(RevenueRollup.invoice_count), 0)).where(pending).scalar_subquery(),
+            select(func.coalesce(func.sum(RevenueRollup.amount_cents), 0))
+            .where(RevenueRollup.payment_status == 'paid').scalar_subquery(),
+        )).one()
+        keys = ('patients', 'doctors', 'appointments_today', 'pending_invoices', 'revenue_cents')
+        return dict(zip(keys, row))
+
+    return _cached(_admin_key(day), compute)
+
+
+def _load_day_schedules(day, doctor_ids=None):
+    """Return ``{doctor_id: [appointment, ...]}`` for one day in a single query."""
+    start, end = _day_bounds(day)
+    stmt = (select(Appointment.doctor_id, Appointment.appointment_id, Appointment.start, Appointment.end,
+                   Appointment.status, Patient.patient_id, Patient.first_name, Patient.last_name)
+            .join(Patient, Patient.patient_id == Appointment.patient_id)
+            .where(Appointment.start >= start, Appointment.start < end)
+            .order_by(Appointment.doctor_id, Appointment.start))
+    if doctor_ids is not None:
+        stmt = stmt.where(Appointment.doctor_id.in_(doctor_ids))
+    schedules = {doctor_id: [] for doctor_id in doctor_ids or ()}
+    for row in db.session.execute(stmt):
+        schedules.setdefault(row.doctor_id, []).append({
+            'appointment_id': row.appointment_id,
+            'start': row.start.isoformat(),
+            'end': row.end.isoformat(),
+            'status': row.status,
+            'patient_id': row.patient_id,
+            'patient_name': f'{row.first_name} {row.last_name}',
+        })
+    return schedules
+
+
+def doctor_day_schedule(doctor_id, day=None):
+    day = day or date.today()
+    return _cached(_schedule_key(doctor_id, day), lambda: _load_day_schedules(day, [doctor_id])[doctor_id])
+
+
+def patient_summary(patient_id):
+    def compute():
+        upcoming = db.session.execute(
+            select(Appointment.appointment_id, Appointment.start, Appointment.status,
+                   Doctor.first_name, Doctor.last_name)
+            .join(Doctor, Doctor.doctor_id == Appointment.doctor_id)
+            .where(Appointment.patient_id == patient_id, Appointment.start >= datetime.now())
+            .order_by(Appointment.start).limit(5)
+        ).all()
+        record_count = db.session.scalar(
+            select(func.count()).select_from(MedicalRecord).where(MedicalRecord.patient_id == patient_id))
+        return {
+            'upcoming': [{'appointment_id': row.appointment_id, 'start': row.start.isoformat(),
+                          'status': row.status, 'doctor_name': f'{row.first_name} {row.last_name}'}
+                         for row in upcoming],
+            'record_count': record_count,
+        }
+
+    return _cached(_patient_key(patient_id), compute)
+
+
+def warm_dashboards(day=None):
+    """Precompute every doctor's schedule for ``day`` (default today)."""
+    day = day or date.today()
+    doctor_ids = db.session.scalars(select(Doctor.doctor_id)).all()
+    for doctor_id, schedule in _load_day_schedules(day, doctor_ids).items():
+        dashboard_cache.set(_schedule_key(doctor_id, day), schedule)
+    return len(doctor_ids)
+
+
+def _old_and_new(target, attribute):
+    history = inspect(target).attrs[attribute].history
+    return {value for value in (*history.deleted, getattr(target, attribute)) if value is not None}
+
+
+def _appointment_changed(mapper, connection, target):
+    days = {start.date() for start in _old_and_new(target, 'start')}
+    keys = [_admin_key(date.today())]
+    keys += [_patient_key(patient_id) for patient_id in _old_and_new(target, 'patient_id')]
+    keys += [_schedule_key(doctor_id, day) for doctor_id in _old_and_new(target, 'doctor_id') for day in days]
+    invalidate_after_commit(target, dashboard_cache, *keys)
+
+
+def _invoice_changed(mapper, connection, target):
+    invalidate_after_commit(target, dashboard_cache, _admin_key(date.today()))
+
+
+def _record_changed(mapper, connection, target):
+    invalidate_after_commit(target, dashboard_cache,
+                            *(_patient_key(patient_id) for patient_id in _old_and_new(target, 'patient_id')))
+
+
+def _headcount_changed(mapper, connection, target):
+    invalidate_after_commit(target, dashboard_cache, _admin_key(date.today()))
+
+
+for _model, _listener, _events in (
+    (Appointment, _appointment_changed, ('after_insert', 'after_update', 'after_delete')),
+    (Invoice, _invoice_changed, ('after_insert', 'after_update', 'after_delete')),
+    (MedicalRecord, _record_changed, ('after_insert', 'after_update', 'after_delete')),
+    (Patient, _headcount_changed, ('after_insert', 'after_delete')),
+    (Doctor, _headcount_changed, ('after_insert', 'after_delete')),
+):
+    for _event in _events:
+        event.listen(_model, _event, _listener)
 
 @app.route('/', methods=['GET', 'POST'])
 def login():
-    print(request.form)
     if request.method == 'POST':
         email = request.form['email']
         password = request.form['password']
         role = request.form['role']
 
         user = Account.query.filter_by(email=email).first()
-        
-        if user and check_password_hash(user.password, password):
+
+        try:
+            valid = user is not None and password_hasher.verify(user.password, password)
+        except HasherBusy:
+            flash('The server is busy, please try again in a moment.', 'danger')
+            return render_template('login.html'), 503
+        if valid and password_hasher.needs_rehash(user.password):
+            try:
+                user.password = password_hasher.hash(password)
+                db.session.commit()
+            except HasherBusy:
+                # The password was right; the upgrade waits for a later login.
+                pass
+
+        if valid:
             login_user(user)
             if user.role == 'admin':
                 flash('Logged in successfully.','success')
@@ -180,7 +881,11 @@ def register():
             flash("Username already exists!", "danger")
             return redirect(url_for('register'))
 
-        hashed_pw = generate_password_hash(password)
+        try:
+            hashed_pw = password_hasher.hash(password)
+        except HasherBusy:
+            flash('The server is busy, please try again in a moment.', 'danger')
+            return render_template('register.html'), 503
         new_account = Account(firstname=firstname, lastname=lastname, email=email, phone=phone, birthdate=birthdate, password=hashed_pw, role=role)
         
         db.session.add(new_account)
@@ -196,7 +901,7 @@ def register():
 def admin_dashboard():
     if current_user.role != 'admin':
         return redirect(url_for('unauthorized'))
-    return render_template('admin_dashboard.html')
+    return render_template('admin_dashboard.html', stats=admin_stats())
 
 
 @app.route('/doctor/dashboard')
@@ -204,7 +909,7 @@ def admin_dashboard():
 def doctor_dashboard():
     if current_user.role != 'doctor':
         return redirect(url_for('unauthorized'))
-    return render_template('doctor_dashboard.html')
+    return render_template('doctor_dashboard.html', schedule=doctor_day_schedule(current_user.doctor_id))
 
 
 @app.route('/patient/dashboard')
@@ -212,7 +917,155 @@ def doctor_dashboard():
 def patient_dashboard():
     if current_user.role != 'patient':
         return redirect(url_for('unauthorized'))
-    return render_template('patient_dashboard.html')
+    return render_template('patient_dashboard.html', summary=patient_summary(current_user.patient_id))
+
+
+@app.route('/doctor/schedule')
+@login_required
+def doctor_schedule():
+    if current_user.role != 'doctor':
+        return redirect(url_for('unauthorized'))
+    try:
+        day = date.fromisoformat(request.args.get('date', date.today().isoformat()))
+    except ValueError:
+        return jsonify(error='Invalid date'), 400
+    return jsonify(date=day.isoformat(), appointments=doctor_day_schedule(current_user.doctor_id, day))
+
+
+@app.route('/appointments/slots')
+@login_required
+def appointment_slots():
+    doctor_ids = request.args.getlist('doctor_id', type=int)
+    try:
+        first_day = date.fromisoformat(request.args.get('date', date.today().isoformat()))
+    except ValueError:
+        return jsonify(error='Invalid date'), 400
+    days = min(request.args.get('days', 1, type=int), 14)
+
+    window_start = datetime.combine(first_day, CLINIC_OPEN)
+    window_end = datetime.combine(first_day + timedelta(days=days), CLINIC_OPEN)
+    schedules = load_schedules(doctor_ids, window_start, window_end)
+
+    slots = {}
+    for doctor_id, schedule in schedules.items():
+        slots[doctor_id] = [
+            slot.isoformat()
+            for offset in range(days)
+            for slot in schedule.free_slots(first_day + timedelta(days=offset))
+        ]
+    return jsonify(slots)
+
+
+@app.route('/appointments/book', methods=['POST'])
+@login_required
+def appointment_book():
+    if current_user.role != 'patient' or current_user.patient_id is None:
+        return redirect(url_for('unauthorized'))
+    try:
+        doctor_id = int(request.form['doctor_id'])
+        start = datetime.fromisoformat(request.form['start'])
+    except (KeyError, ValueError):
+        return jsonify(error='doctor_id and start are required'), 400
+    minutes = request.form.get('minutes', SLOT_MINUTES, type=int)
+    if not 0 < minutes <= MAX_APPOINTMENT_MINUTES:
+        return jsonify(error='Invalid appointment length'), 400
+
+    try:
+        appointment = book_appointment(current_user.patient_id, doctor_id,
+                                       start, start + timedelta(minutes=minutes))
+    except ValueError as exc:
+        return jsonify(error=str(exc)), 400
+    if appointment is None:
+        return jsonify(error='That slot is no longer available'), 409
+    return jsonify(appointment_id=appointment.appointment_id,
+                   start=appointment.start.isoformat(),
+                   end=appointment.end.isoformat()), 201
+
+
+@app.route('/patients/<int:patient_id>/chart.jsonl')
+@login_required
+def patient_chart_export(patient_id):
+    allowed = current_user.role in ('admin', 'doctor') or current_user.patient_id == patient_id
+    if not allowed:
+        return redirect(url_for('unauthorized'))
+    return _jsonl_download(export_chart(patient_id), f'patient-{patient_id}.jsonl')
+
+
+@app.route('/admin/export.jsonl')
+@login_required
+def database_export():
+    if current_user.role != 'admin':
+        return redirect(url_for('unauthorized'))
+    return _jsonl_download(export_database(), 'clinic-export.jsonl')
+
+
+@app.route('/records/search')
+@login_required
+def record_search():
+    patient_id = request.args.get('patient_id', type=int)
+    doctor_id = request.args.get('doctor_id', type=int)
+    if current_user.role == 'patient':
+        # An account without a patient chart has nothing to search; it must
+        # never fall through to an unscoped search.
+        if current_user.patient_id is None:
+            return jsonify(results=[], next=None)
+        patient_id = current_user.patient_id
+    elif current_user.role != 'doctor' and current_user.role != 'admin':
+        return redirect(url_for('unauthorized'))
+
+    after = None
+    if request.args.get('after'):
+        try:
+            rank, record_id = request.args['after'].split(':')
+            after = (float(rank), int(record_id))
+        except ValueError:
+            return jsonify(error='Invalid cursor'), 400
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+
+    results, cursor = search.search_records(db.session, request.args.get('q', ''),
+                                            patient_id=patient_id, doctor_id=doctor_id,
+                                            after=after, limit=limit,
+                                            max_candidates=app.config['SEARCH_MAX_CANDIDATES'])
+    return jsonify(results=results, next=f'{cursor[0]!r}:{cursor[1]}' if cursor else None)
+
+
+@app.route('/admin/reports/revenue')
+@login_required
+def revenue_report():
+    if current_user.role != 'admin':
+        return redirect(url_for('unauthorized'))
+    dimension = request.args.get('by', 'day')
+    try:
+        first_day = date.fromisoformat(request.args['from']) if request.args.get('from') else None
+        last_day = date.fromisoformat(request.args['to']) if request.args.get('to') else None
+        with reporting_session() as session:
+            rows = billing.revenue_report(session, dimension, first_day, last_day)
+    except ValueError as exc:
+        return jsonify(error=str(exc)), 400
+    return jsonify(by=dimension, rows=rows)
+
+
+@app.route('/admin/cache-stats')
+@login_required
+def cache_stats():
+    if current_user.role != 'admin':
+        return redirect(url_for('unauthorized'))
+    return jsonify(identity=identity_cache.stats(), dashboard=dashboard_cache.stats())
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    # The client address is no use here: behind a reverse proxy on the same
+    # host every request comes from 127.0.0.1.
+    expected = app.config['METRICS_TOKEN']
+    if not expected:
+        return "Not Found", 404
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    if scheme.lower() != 'bearer':
+        token = request.args.get('token', '')
+    if not hmac.compare_digest(token.encode(), expected.encode()):
+        return "Forbidden", 403
+    return Response(instrumentation.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/unauthorized')
@@ -226,8 +1079,226 @@ def logout():
     logout_user()
     return redirect(url_for('login'))
 
+# ---------------------------------------------------------------------------
+# JSON API (v1)
+# ---------------------------------------------------------------------------
+#
+# Collections are paged by keyset: ``cursor`` is an opaque token holding the
+# sort key of the last item returned. ``fields`` is a restx field mask, e.g.
+# ``fields=appointment_id,start,invoices{amount_cents}``. Relationships are only
+# eager-loaded when the mask asks for them, so every page costs a fixed
+# number of queries whatever its size.
+
+api_v1 = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+api = Api(api_v1, version='1.0', title='Clinic API', doc='/docs')
+patients_ns = api.namespace('patients', description='Patient appointments, records and prescriptions')
+
+
+def _full_name(person):
+    # A row whose doctor has gone missing should not fail the whole page.
+    return f'{person.first_name} {person.last_name}' if person is not None else None
+
+
+invoice_fields = api.model('Invoice', {
+    'invoice_id': fields.Integer,
+    'service_id': fields.Integer,
+    'amount_cents': fields.Integer,
+    'payment_status': fields.String,
+})
+
+appointment_fields = api.model('Appointment', {
+    'appointment_id': fields.Integer,
+    'doctor_id': fields.Integer,
+    'doctor_name': fields.String(attribute=lambda a: _full_name(a.doctor)),
+    'start': fields.DateTime(dt_format='iso8601'),
+    'end': fields.DateTime(dt_format='iso8601'),
+    'status': fields.String,
+    'invoices': fields.List(fields.Nested(invoice_fields)),
+})
+
+prescription_fields = api.model('Prescription', {
+    'prescription_id': fields.Integer,
+    'record_id': fields.Integer,
+    'medication_name': fields.String,
+    'dosage': fields.String,
+    'instructions': fields.String,
+})
+
+record_fields = api.model('MedicalRecord', {
+    'record_id': fields.Integer,
+    'doctor_id': fields.Integer,
+    'doctor_name': fields.String(attribute=lambda r: _full_name(r.doctor)),
+    'visit_date': fields.String,
+    'diagnosis': fields.String,
+    'notes': fields.String,
+    'prescriptions': fields.List(fields.Nested(prescription_fields)),
+})
+
+patient_prescription_fields = api.inherit('PatientPrescription', prescription_fields, {
+    'visit_date': fields.String(attribute='record.visit_date'),
+})
+
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor, parsers):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return [parse(value) for parse, value in zip(parsers, values, strict=True)]
+    except (ValueError, TypeError):
+        api.abort(400, 'Invalid cursor')
+
+
+def _check_patient_access(patient_id):
+    if current_user.role == 'patient' and current_user.patient_id != patient_id:
+        api.abort(403, 'You can only view your own chart')
+    if current_user.role not in ('patient', 'doctor', 'admin'):
+        api.abort(403)
+
+
+def api_page(stmt, model, sort_key, parsers, loaders):
+    """Run one keyset page of ``stmt`` and return it as a conditional JSON response.
+
+    ``sort_key`` lists the columns the collection is ordered by (unique
+    together); ``loaders`` maps mask field names to the loader options that
+    field needs.
+    """
+    limit = request.args.get('limit', app.config['API_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, app.config['API_MAX_PAGE_SIZE']))
+    output = model
+    if request.args.get('fields'):
+        # resolved includes the fields of inherited models.
+        try:
+            mask = Mask(request.args['fields'])
+            _check_mask(mask, model)
+            output = mask.apply(model.resolved)
+        except MaskError as exc:
+            api.abort(400, f'Invalid fields: {exc}')
+
+    for name, option in loaders.items():
+        if name in output:
+            stmt = stmt.options(option)
+    if request.args.get('cursor'):
+        stmt = stmt.where(tuple_(*sort_key) > tuple_(*decode_cursor(request.args['cursor'], parsers)))
+
+    items = db.session.scalars(stmt.order_by(*sort_key).limit(limit + 1)).unique().all()
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        last = items[-1]
+        next_cursor = encode_cursor([_cursor_value(getattr(last, column.key)) for column in sort_key])
+
+    response = jsonify(items=marshal(items, output), next_cursor=next_cursor)
+    response.add_etag()
+    return response.make_conditional(request)
+
+
+def _check_mask(mask, model):
+    """Raise MaskError for names ``model`` does not have; restx would fail on them while marshalling."""
+    resolved = model.resolved
+    for name, nested in mask.items():
+        if name == '*':
+            continue
+        if name not in resolved:
+            raise MaskError(f'unknown field {name!r}')
+        if isinstance(nested, Mask):
+            field = resolved[name]
+            if isinstance(field, fields.List):
+                field = field.container
+            if not isinstance(field, fields.Nested):
+                raise MaskError(f'{name!r} has no sub-fields')
+            _check_mask(nested, field.nested)
+
+
+def _cursor_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class PatientResource(Resource):
+    method_decorators = [login_required]
+
+
+@patients_ns.route('/<int:patient_id>/appointments')
+class PatientAppointments(PatientResource):
+    @patients_ns.doc(params={'cursor': 'Page token', 'limit': 'Page size', 'fields': 'Field mask'})
+    def get(self, patient_id):
+        _check_patient_access(patient_id)
+        return api_page(
+            select(Appointment).where(Appointment.patient_id == patient_id),
+            appointment_fields,
+            sort_key=[Appointment.start, Appointment.appointment_id],
+            parsers=[datetime.fromisoformat, int],
+            loaders={'doctor_name': joinedload(Appointment.doctor),
+                     'invoices': selectinload(Appointment.invoices)},
+        )
+
+
+@patients_ns.route('/<int:patient_id>/records')
+class PatientRecords(PatientResource):
+    @patients_ns.doc(params={'cursor': 'Page token', 'limit': 'Page size', 'fields': 'Field mask'})
+    def get(self, patient_id):
+        _check_patient_access(patient_id)
+        return api_page(
+            select(MedicalRecord).where(MedicalRecord.patient_id == patient_id),
+            record_fields,
+            sort_key=[MedicalRecord.record_id],
+            parsers=[int],
+            loaders={'doctor_name': joinedload(MedicalRecord.doctor),
+                     'prescriptions': selectinload(MedicalRecord.prescriptions)},
+        )
+
+
+@patients_ns.route('/<int:patient_id>/prescriptions')
+class PatientPrescriptions(PatientResource):
+    @patients_ns.doc(params={'cursor': 'Page token', 'limit': 'Page size', 'fields': 'Field mask'})
+    def get(self, patient_id):
+        _check_patient_access(patient_id)
+        return api_page(
+            select(Prescription).join(Prescription.record).where(MedicalRecord.patient_id == patient_id),
+            patient_prescription_fields,
+            sort_key=[Prescription.prescription_id],
+            parsers=[int],
+            loaders={'visit_date': contains_eager(Prescription.record)},
+        )
+
+
+app.register_blueprint(api_v1)
+
+
+def _reset_engines_after_fork():
+    # With gunicorn --preload the startup below runs in the master, and each
+    # forked worker would otherwise reuse its pooled SQLite connections.
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False: the connections still belong to the parent.
+            engine.dispose(close=False)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_engines_after_fork)
+
+
 with app.app_context():
-    db.create_all()
+    # A fresh database gets the current schema and is stamped as migrated;
+    # an existing one is brought up to date with "flask db upgrade". Databases
+    # created before migrations existed have the baseline schema but no
+    # alembic_version table, so they are stamped at the baseline first.
+    _inspector = inspect(db.engine)
+    if not _inspector.has_table('account'):
+        db.create_all()
+        stamp()
+    elif not _inspector.has_table('alembic_version'):
+        stamp(revision=BASELINE_REVISION)
+    if app.config['DASHBOARD_WARM_ON_STARTUP']:
+        try:
+            warm_dashboards()
+        except SQLAlchemyError:
+            # Schema not migrated yet (e.g. while running "flask db upgrade").
+            db.session.rollback()
+        finally:
+            db.session.remove()
 
 if __name__ == '__main__':
     app.run(debug=True)
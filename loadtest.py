@@ -0,0 +1,154 @@
+"""Generate a synthetic clinic and replay a request mix against it.
+
+Runs entirely in-process with the Flask test client, then prints the
+per-route latency and SQL counts collected by the /metrics instrumentation.
+
+    python loadtest.py --patients 5000 --requests 2000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--db', help='SQLite file to use (default: a new temporary file)')
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--doctors', type=int, default=20)
+    parser.add_argument('--visits', type=int, default=5, help='Appointments and records per patient')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+
+DIAGNOSES = ['dental caries', 'gingivitis', 'periodontitis', 'pulpitis', 'tooth abscess',
+             'malocclusion', 'bruxism', 'enamel erosion', 'impacted wisdom tooth', 'oral thrush']
+MEDICATIONS = ['amoxicillin', 'ibuprofen', 'paracetamol', 'chlorhexidine', 'metronidazole',
+               'clindamycin', 'fluconazole', 'lidocaine']
+
+
+def generate(db, models, patients, doctors, visits, password_hash, rng):
+    """Bulk-insert a synthetic clinic; every account shares ``password_hash``."""
+    from sqlalchemy import insert
+
+    Account, Patient, Doctor, Appointment, MedicalRecord, Prescription, Service, Invoice = models
+
+    def account(i, role):
+        return dict(account_id=i, firstname=f'{role}{i}', lastname=f'last{i}', email=f'{role}{i}@example.com',
+                    phone='555-0100', birthdate='1990-01-01', password=password_hash, role=role)
+
+    admin_id = 1
+    doctor_ids = range(2, 2 + doctors)
+    patient_ids = range(2 + doctors, 2 + doctors + patients)
+    db.session.execute(insert(Account), [account(admin_id, 'admin')]
+                       + [account(i, 'doctor') for i in doctor_ids]
+                       + [account(i, 'patient') for i in patient_ids])
+    db.session.execute(insert(Doctor), [
+        dict(doctor_id=n, first_name='Doc', last_name=f'{n}', specialization='Dentistry',
+             contact_number='555-0101', account_id=i)
+        for n, i in enumerate(doctor_ids, start=1)])
+    db.session.execute(insert(Patient), [
+        dict(patient_id=n, first_name='Pat', last_name=f'{n}', birthdate='1990-01-01', gender='F',
+             contact_number='555-0102', account_id=i)
+        for n, i in enumerate(patient_ids, start=1)])
+    db.session.execute(insert(Service), [
+        dict(service_id=1, name='Cleaning', description='Routine cleaning', fee_cents=5000),
+        dict(service_id=2, name='Filling', description='Composite filling', fee_cents=12000)])
+
+    day0 = datetime.combine(datetime.today().date(), datetime.min.time()) - timedelta(days=30)
+    appointment_id = record_id = 0
+    for patient_id in range(1, patients + 1):
+        appointments, records, prescriptions, invoices = [], [], [], []
+        for _ in range(visits):
+            appointment_id += 1
+            record_id += 1
+            doctor_id = rng.randint(1, doctors)
+            start = day0 + timedelta(days=rng.randint(0, 60), hours=rng.randint(9, 16))
+            appointments.append(dict(appointment_id=appointment_id, patient_id=patient_id, doctor_id=doctor_id,
+                                     start=start, end=start + timedelta(minutes=30), status='scheduled'))
+            service_id = rng.randint(1, 2)
+            invoices.append(dict(appointment_id=appointment_id, service_id=service_id,
+                                 amount_cents=5000 if service_id == 1 else 12000,
+                                 payment_status=rng.choice(['paid', 'pending'])))
+            records.append(dict(record_id=record_id, patient_id=patient_id, doctor_id=doctor_id,
+                                visit_date=start.date().isoformat(), diagnosis=rng.choice(DIAGNOSES),
+                                notes=f'{rng.choice(DIAGNOSES)} noted on examination'))
+            prescriptions.append(dict(record_id=record_id, medication_name=rng.choice(MEDICATIONS),
+                                      dosage='500mg', instructions='Twice daily after meals'))
+        db.session.execute(insert(Appointment), appointments)
+        db.session.execute(insert(Invoice), invoices)
+        db.session.execute(insert(MedicalRecord), records)
+        db.session.execute(insert(Prescription), prescriptions)
+    db.session.commit()
+    return admin_id, list(doctor_ids), list(patient_ids)
+
+
+def main():
+    args = parse_args()
+    path = args.db or os.path.join(tempfile.mkdtemp(), 'loadtest.db')
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(path)}'
+    os.environ.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')
+    # Everything stays in this process, like the bench_*.py scripts.
+    os.environ['IDENTITY_CACHE_BACKEND'] = 'memory'
+    os.environ['DASHBOARD_CACHE_BACKEND'] = 'memory'
+    os.environ['METRICS_BACKEND'] = 'memory'
+
+    import clinic
+    from clinic import (app, db, metrics, Account, Patient, Doctor, Appointment, MedicalRecord,
+                        Prescription, Service, Invoice)
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+    with app.app_context():
+        password_hash = clinic.password_hasher.hash('password')
+        models = (Account, Patient, Doctor, Appointment, MedicalRecord, Prescription, Service, Invoice)
+        admin_id, doctor_ids, patient_ids = generate(db, models, args.patients, args.doctors, args.visits,
+                                                     password_hash, rng)
+    print(f'Generated {args.patients} patients in {time.perf_counter() - started:.1f}s at {path}',
+          file=sys.stderr)
+
+    today = datetime.today().date().isoformat()
+
+    def patient_requests(n):
+        return [f'/api/v1/patients/{n}/appointments', f'/api/v1/patients/{n}/records?limit=20',
+                f'/patients/{n}/chart.jsonl', '/records/search?q=gingivitis',
+                f'/appointments/slots?doctor_id=1&doctor_id=2&date={today}&days=7']
+
+    def admin_requests():
+        return ['/admin/reports/revenue?by=day', '/admin/reports/revenue?by=doctor_id',
+                f'/api/v1/patients/{rng.randint(1, args.patients)}/prescriptions',
+                f'/records/search?q={rng.choice(MEDICATIONS)}&doctor_id={rng.randint(1, args.doctors)}']
+
+    clients = []
+    for account_id, role in [(admin_id, 'admin'), (rng.choice(patient_ids), 'patient')]:
+        client = app.test_client()
+        client.post('/', data={'email': f'{role}{account_id}@example.com', 'password': 'password', 'role': role})
+        patient_no = account_id - 1 - args.doctors
+        clients.append((client, admin_requests if role == 'admin' else lambda n=patient_no: patient_requests(n)))
+
+    started = time.perf_counter()
+    for _ in range(args.requests):
+        client, paths = rng.choice(clients)
+        response = client.get(rng.choice(paths()))
+        # Reading the body runs streamed exports, which are timed on close.
+        response.get_data()
+        response.close()
+    elapsed = time.perf_counter() - started
+    print(f'{args.requests} requests in {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s)')
+
+    latency = metrics.request_latency.snapshot()
+    queries = metrics.request_queries.snapshot()
+    print(f'{"route":<60} {"count":>6} {"mean ms":>8} {"stmts":>6}')
+    for (route, method), (count, total) in sorted(latency.items()):
+        statements = queries.get((route,), (1, 0))
+        print(f'{method + " " + route:<60} {count:>6} {total / count * 1000:>8.2f} '
+              f'{statements[1] / max(statements[0], 1):>6.1f}')
+    clinic.password_hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
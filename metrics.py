@@ -0,0 +1,345 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+from flask import has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_registry = []
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{str(value).replace(chr(34), chr(39))}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def set(self, value, *label_values):
+        """Copy a total kept elsewhere, e.g. a cache's own hit count."""
+        with self._lock:
+            self._values[label_values] = value
+
+    def dump(self):
+        with self._lock:
+            return [[list(label_values), value] for label_values, value in self._values.items()]
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self, dumps=None):
+        totals = {}
+        for dump in [self.dump()] if dumps is None else dumps:
+            for label_values, value in dump:
+                label_values = tuple(label_values)
+                totals[label_values] = totals.get(label_values, 0) + value
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        for label_values, value in sorted(totals.items()):
+            yield f'{self.name}{_format_labels(self.labels, label_values)} {value}'
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0, 0.0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += 1
+            series[2] += value
+
+    def snapshot(self):
+        """Return ``{labels: (count, sum)}`` for every series."""
+        with self._lock:
+            return {labels: (series[1], series[2]) for labels, series in self._series.items()}
+
+    def dump(self):
+        with self._lock:
+            return [[list(labels), list(counts), count, total] for labels, (counts, count, total) in self._series.items()]
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render(self, dumps=None):
+        totals = {}
+        for dump in [self.dump()] if dumps is None else dumps:
+            for label_values, counts, count, total in dump:
+                series = totals.setdefault(tuple(label_values), [[0] * len(self.buckets), 0, 0.0])
+                series[0] = [a + b for a, b in zip(series[0], counts)]
+                series[1] += count
+                series[2] += total
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        names = self.labels + ('le',)
+        for label_values, (counts, count, total) in sorted(totals.items()):
+            cumulative = 0
+            for bound, bucket in zip(self.buckets, counts):
+                cumulative += bucket
+                yield f'{self.name}_bucket{_format_labels(names, label_values + (bound,))} {cumulative}'
+            yield f'{self.name}_bucket{_format_labels(names, label_values + ("+Inf",))} {count}'
+            yield f'{self.name}_count{_format_labels(self.labels, label_values)} {count}'
+            yield f'{self.name}_sum{_format_labels(self.labels, label_values)} {total}'
+
+
+request_latency = Histogram('http_request_duration_seconds', 'Request latency by route.',
+                            LATENCY_BUCKETS, labels=('route', 'method'))
+request_total = Counter('http_requests_total', 'Requests by route and status.',
+                        labels=('route', 'method', 'status'))
+request_queries = Histogram('db_statements_per_request', 'SQL statements executed per request.',
+                            QUERY_COUNT_BUCKETS, labels=('route',))
+request_sql_time = Histogram('db_seconds_per_request', 'Time spent in SQL per request.',
+                             LATENCY_BUCKETS, labels=('route',))
+template_latency = Histogram('template_render_seconds', 'Template render time.',
+                             LATENCY_BUCKETS, labels=('template',))
+slow_queries = Counter('db_slow_statements_total', 'Statements slower than the slow-query threshold.',
+                       labels=('fingerprint',))
+
+
+_collectors = []
+
+
+def before_collect(fn):
+    """Register ``fn`` to run before metrics are dumped or rendered, to copy totals kept elsewhere."""
+    _collectors.append(fn)
+    return fn
+
+
+def dump():
+    """Return this process's metrics as JSON-serialisable state."""
+    for fn in _collectors:
+        fn()
+    return {metric.name: metric.dump() for metric in _registry}
+
+
+def render(dumps=None):
+    """Render the exposition text for this process, or the sum of ``dumps`` from several."""
+    if dumps is None:
+        dumps = [dump()]
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render([state.get(metric.name, []) for state in dumps]))
+    return '\n'.join(lines) + '\n'
+
+
+def _process_key():
+    # Pids are reused, so the start time keeps a new worker from taking over
+    # (and shrinking) the totals of an exited one.
+    return f'{os.getpid()}:{time.time():.6f}'
+
+
+_process = _process_key()
+
+
+def _reset_after_fork():
+    # A forked worker starts from zero; what the parent counted stays the
+    # parent's, instead of being reported once more by every child.
+    global _process
+    _process = _process_key()
+    for metric in _registry:
+        metric.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class SharedStore:
+    """Metric states of every worker process on the host, in one SQLite file.
+
+    Each process writes its own row, at most every ``interval`` seconds and
+    at exit, and a scrape sums all rows, so whichever worker answers
+    /metrics reports totals for all of them. Rows of exited workers are
+    kept so the totals never go backwards.
+    """
+
+    def __init__(self, path, interval=1.0):
+        self.path = path
+        self.interval = interval
+        self._published = 0.0
+        with closing(self._connect()) as conn, conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS metrics '
+                         '(process TEXT PRIMARY KEY, state TEXT NOT NULL, updated REAL NOT NULL)')
+        atexit.register(self.publish, force=True)
+
+    def _connect(self):
+        # A connection per call: publishing is throttled, and nothing is
+        # left open to carry across a fork.
+        return sqlite3.connect(self.path, timeout=5)
+
+    def publish(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._published < self.interval:
+            return
+        self._published = now
+        with closing(self._connect()) as conn, conn:
+            conn.execute('INSERT OR REPLACE INTO metrics (process, state, updated) VALUES (?, ?, ?)',
+                         (_process, json.dumps(dump()), time.time()))
+
+    def collect(self):
+        """Return the state of every process, this one's taken fresh."""
+        self.publish(force=True)
+        with closing(self._connect()) as conn:
+            return [json.loads(state) for (state,) in conn.execute('SELECT state FROM metrics')]
+
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fingerprint(statement):
+    """Normalise a statement so queries differing only in literals group together."""
+    normalised = _LITERALS.sub('?', statement)
+    normalised = _IN_LISTS.sub('(?, ...)', normalised)
+    return _WHITESPACE.sub(' ', normalised).strip()
+
+
+class TimedTemplate(Template):
+    def render(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            template_latency.observe(time.perf_counter() - start, self.name or '<string>')
+
+
+class _RequestStats:
+    __slots__ = ('start', 'statements', 'sql_seconds')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.sql_seconds = 0.0
+
+
+class Instrumentation:
+    """Per-request latency, SQL and template timing for a Flask app.
+
+    Only cheap counters are kept per request; statement text is only
+    fingerprinted when a statement crosses the slow-query threshold.
+    Per-request figures live in the WSGI environ rather than ``g`` because a
+    streamed body runs under stream_with_context, which gets a new app
+    context (and ``g``) but the same request.
+    """
+
+    def __init__(self, app=None):
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_SLOW_QUERY_SECONDS', 0.1)
+        app.config.setdefault('METRICS_DEBUG_HEADER', False)
+        self.slow_query_seconds = app.config['METRICS_SLOW_QUERY_SECONDS']
+        self.debug_header = app.config['METRICS_DEBUG_HEADER']
+        app.jinja_env.template_class = TimedTemplate
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+        event.listen(Engine, 'handle_error', self._handle_error)
+
+    def share(self, path, interval=1.0):
+        """Publish to a SharedStore at ``path`` so any worker can report every worker's totals."""
+        self.store = SharedStore(path, interval)
+
+    def render(self):
+        return render(self.store.collect() if self.store is not None else None)
+
+    def _start_request(self):
+        request.environ['metrics.request'] = _RequestStats()
+
+    def _finish_request(self, response):
+        stats = request.environ.get('metrics.request')
+        if stats is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        method = request.method
+        if self.debug_header:
+            response.headers['Server-Timing'] = (
+                f'app;dur={(time.perf_counter() - stats.start) * 1000:.1f}, '
+                f'db;dur={stats.sql_seconds * 1000:.1f};desc="{stats.statements} statements"'
+            )
+        if response.is_streamed:
+            # The body is generated after this hook returns; count it once
+            # the server has finished sending it.
+            response.call_on_close(lambda: self._record(stats, route, method, response.status_code))
+        else:
+            self._record(stats, route, method, response.status_code)
+        return response
+
+    def _record(self, stats, route, method, status):
+        request_latency.observe(time.perf_counter() - stats.start, route, method)
+        request_total.inc(route, method, status)
+        request_queries.observe(stats.statements, route)
+        request_sql_time.observe(stats.sql_seconds, route)
+        if self.store is not None:
+            self.store.publish()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append((context, time.perf_counter()))
+
+    def _handle_error(self, exception_context):
+        # after_cursor_execute does not run for a statement that fails, so its
+        # entry is dropped here. Errors raised later, e.g. while fetching
+        # rows, find their entry already gone.
+        connection = exception_context.connection
+        starts = connection.info.get('metrics_query_start') if connection is not None else None
+        if starts and starts[-1][0] is exception_context.execution_context:
+            starts.pop()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['metrics_query_start'].pop()[1]
+        stats = request.environ.get('metrics.request') if has_request_context() else None
+        if stats is not None:
+            stats.statements += 1
+            stats.sql_seconds += elapsed
+        if elapsed >= self.slow_query_seconds:
+            text = fingerprint(statement)
+            digest = hashlib.sha1(text.encode()).hexdigest()[:12]
+            slow_queries.inc(digest)
+            logger.warning('Slow query %s (%.1f ms): %s', digest, elapsed * 1000, text)
@@ -0,0 +1,108 @@
+"""appointment start and end datetimes
+
+Revision ID: 359c7eadd22f
+Revises: a0da174be287
+Create Date: 2026-10-17 18:31:03.416153
+
+"""
+from datetime import datetime, timedelta
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '359c7eadd22f'
+down_revision = 'a0da174be287'
+branch_labels = None
+depends_on = None
+
+# Length given to legacy rows, which only recorded a start time.
+LEGACY_MINUTES = 30
+
+# Formats seen in the free-form legacy columns, tried in order. Slashed
+# dates are read month first.
+LEGACY_DATE_FORMATS = ('%Y-%m-%d', '%Y/%m/%d', '%m/%d/%Y', '%m-%d-%Y', '%m/%d/%y',
+                       '%b %d %Y', '%B %d %Y', '%d %b %Y', '%d %B %Y')
+LEGACY_TIME_FORMATS = ('%H:%M', '%H:%M:%S', '%I:%M %p', '%I:%M%p', '%I %p', '%I%p', '%H%M')
+
+appointment = sa.table(
+    'appointment',
+    sa.column('appointment_id', sa.Integer),
+    sa.column('appointment_date', sa.String),
+    sa.column('appointment_time', sa.String),
+    sa.column('start', sa.DateTime),
+    sa.column('end', sa.DateTime),
+)
+
+
+def _parse(value, formats):
+    value = ' '.join(value.replace(',', ' ').replace('.', '').split())
+    for fmt in formats:
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    raise ValueError(value)
+
+
+def parse_legacy(day, at):
+    """Combine a legacy date and time string, raising ValueError if either is unreadable."""
+    return datetime.combine(_parse(day, LEGACY_DATE_FORMATS).date(),
+                            _parse(at, LEGACY_TIME_FORMATS).time())
+
+
+def upgrade():
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(appointment.c.appointment_id,
+                                  appointment.c.appointment_date,
+                                  appointment.c.appointment_time)).all()
+
+    # Parse everything before touching the schema: SQLite DDL is not
+    # transactional, so failing half way would leave the new columns behind.
+    starts, bad = {}, []
+    for appointment_id, day, at in rows:
+        try:
+            starts[appointment_id] = parse_legacy(day or '', at or '')
+        except ValueError:
+            bad.append(f'  appointment {appointment_id}: {day!r} {at!r}')
+    if bad:
+        raise RuntimeError(f'{len(bad)} appointments have an unreadable date or time; '
+                           'fix them and re-run the upgrade:\n' + '\n'.join(bad[:50]))
+
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('start', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('end', sa.DateTime(), nullable=True))
+
+    for appointment_id, start in starts.items():
+        conn.execute(appointment.update()
+                     .where(appointment.c.appointment_id == appointment_id)
+                     .values(start=start, end=start + timedelta(minutes=LEGACY_MINUTES)))
+
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.alter_column('start', existing_type=sa.DateTime(), nullable=False)
+        batch_op.alter_column('end', existing_type=sa.DateTime(), nullable=False)
+        batch_op.create_index('ix_appointment_doctor_start', ['doctor_id', 'start'], unique=False)
+        batch_op.drop_column('appointment_time')
+        batch_op.drop_column('appointment_date')
+
+
+def downgrade():
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('appointment_date', sa.VARCHAR(length=10), nullable=True))
+        batch_op.add_column(sa.Column('appointment_time', sa.VARCHAR(length=10), nullable=True))
+
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(appointment.c.appointment_id, appointment.c.start)).all()
+    for appointment_id, start in rows:
+        conn.execute(appointment.update()
+                     .where(appointment.c.appointment_id == appointment_id)
+                     .values(appointment_date=start.date().isoformat(),
+                             appointment_time=start.strftime('%H:%M')))
+
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.alter_column('appointment_date', existing_type=sa.VARCHAR(length=10), nullable=False)
+        batch_op.alter_column('appointment_time', existing_type=sa.VARCHAR(length=10), nullable=False)
+        batch_op.drop_index('ix_appointment_doctor_start')
+        batch_op.drop_column('end')
+        batch_op.drop_column('start')
@@ -0,0 +1,30 @@
+"""record search index
+
+Revision ID: 6c1f2a9d4e10
+Revises: 103da6df9ef9
+Create Date: 2026-10-17 18:40:12.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from search import REBUILD_SQL, SEARCH_DDL
+
+
+# revision identifiers, used by Alembic.
+revision = '6c1f2a9d4e10'
+down_revision = '103da6df9ef9'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for statement in SEARCH_DDL + REBUILD_SQL:
+        op.execute(statement)
+
+
+def downgrade():
+    for trigger in ('record_search_ai', 'record_search_au', 'record_search_ad',
+                    'prescription_search_ai', 'prescription_search_au', 'prescription_search_ad'):
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    op.execute('DROP TABLE IF EXISTS record_search')
@@ -0,0 +1,52 @@
+"""foreign key and date indexes
+
+Revision ID: aafd7bd8d521
+Revises: af897d63e809
+Create Date: 2026-10-17 18:39:29.613564
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'aafd7bd8d521'
+down_revision = 'af897d63e809'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.create_index('ix_appointment_patient_start', ['patient_id', 'start'], unique=False)
+        batch_op.create_index('ix_appointment_start', ['start'], unique=False)
+
+    with op.batch_alter_table('invoice', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_invoice_appointment_id'), ['appointment_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_invoice_service_id'), ['service_id'], unique=False)
+
+    with op.batch_alter_table('medical_record', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_medical_record_doctor_id'), ['doctor_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_medical_record_patient_id'), ['patient_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_medical_record_visit_date'), ['visit_date'], unique=False)
+
+    with op.batch_alter_table('prescription', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_prescription_record_id'), ['record_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('prescription', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_prescription_record_id'))
+
+    with op.batch_alter_table('medical_record', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_medical_record_visit_date'))
+        batch_op.drop_index(batch_op.f('ix_medical_record_patient_id'))
+        batch_op.drop_index(batch_op.f('ix_medical_record_doctor_id'))
+
+    with op.batch_alter_table('invoice', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_invoice_service_id'))
+        batch_op.drop_index(batch_op.f('ix_invoice_appointment_id'))
+
+    with op.batch_alter_table('appointment', schema=None) as batch_op:
+        batch_op.drop_index('ix_appointment_start')
+        batch_op.drop_index('ix_appointment_patient_start')
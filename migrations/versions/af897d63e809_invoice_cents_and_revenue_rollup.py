@@ -0,0 +1,171 @@
+"""invoice cents and revenue rollup
+
+Revision ID: af897d63e809
+Revises: 6c1f2a9d4e10
+Create Date: 2026-10-17 18:38:14.913987
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from billing import parse_cents
+
+# The rollup SQL as this revision shipped it. billing.py has moved on since
+# (see b65c7ea1dac4), and a revision must keep doing what it did.
+TRIGGER_NAMES = ['invoice_rollup_ai', 'invoice_rollup_au', 'invoice_rollup_ad',
+                 'appointment_rollup_au']
+
+ROLLUP_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS invoice_rollup_ai AFTER INSERT ON invoice BEGIN
+        INSERT INTO revenue_rollup (day, doctor_id, service_id, payment_status, invoice_count, amount_cents)
+        SELECT date(a.start), a.doctor_id, NEW.service_id, NEW.payment_status, 1, NEW.amount_cents
+        FROM appointment a WHERE a.appointment_id = NEW.appointment_id
+        ON CONFLICT (day, doctor_id, service_id, payment_status) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            amount_cents = amount_cents + excluded.amount_cents;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS invoice_rollup_au
+        AFTER UPDATE OF appointment_id, service_id, amount_cents, payment_status ON invoice BEGIN
+        INSERT INTO revenue_rollup (day, doctor_id, service_id, payment_status, invoice_count, amount_cents)
+        SELECT date(a.start), a.doctor_id, OLD.service_id, OLD.payment_status, -1, -OLD.amount_cents
+        FROM appointment a WHERE a.appointment_id = OLD.appointment_id
+        ON CONFLICT (day, doctor_id, service_id, payment_status) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            amount_cents = amount_cents + excluded.amount_cents;
+        INSERT INTO revenue_rollup (day, doctor_id, service_id, payment_status, invoice_count, amount_cents)
+        SELECT date(a.start), a.doctor_id, NEW.service_id, NEW.payment_status, 1, NEW.amount_cents
+        FROM appointment a WHERE a.appointment_id = NEW.appointment_id
+        ON CONFLICT (day, doctor_id, service_id, payment_status) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            amount_cents = amount_cents + excluded.amount_cents;
+        DELETE FROM revenue_rollup WHERE invoice_count = 0;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS invoice_rollup_ad AFTER DELETE ON invoice BEGIN
+        INSERT INTO revenue_rollup (day, doctor_id, service_id, payment_status, invoice_count, amount_cents)
+        SELECT date(a.start), a.doctor_id, OLD.service_id, OLD.payment_status, -1, -OLD.amount_cents
+        FROM appointment a WHERE a.appointment_id = OLD.appointment_id
+        ON CONFLICT (day, doctor_id, service_id, payment_status) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            amount_cents = amount_cents + excluded.amount_cents;
+        DELETE FROM revenue_rollup WHERE invoice_count = 0;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS appointment_rollup_au AFTER UPDATE OF start, doctor_id ON appointment BEGIN
+        INSERT INTO revenue_rollup (day, doctor_id, service_id, payment_status, invoice_count, amount_cents)
+        SELECT date(OLD.start), OLD.doctor_id, service_id, payment_status, -count(*), -sum(amount_cents)
+            FROM invoice WHERE appointment_id = OLD.appointment_id GROUP BY service_id, payment_status
+        ON CONFLICT (day, doctor_id, service_id, payment_status) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            amount_cents = amount_cents + excluded.amount_cents;
+        INSERT INTO revenue_rollup (day, doctor_id, service_id, payment_status, invoice_count, amount_cents)
+        SELECT date(NEW.start), NEW.doctor_id, service_id, payment_status, count(*), sum(amount_cents)
+            FROM invoice WHERE appointment_id = NEW.appointment_id GROUP BY service_id, payment_status
+        ON CONFLICT (day, doctor_id, service_id, payment_status) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            amount_cents = amount_cents + excluded.amount_cents;
+        DELETE FROM revenue_rollup WHERE invoice_count = 0;
+    END""",
+]
+
+REBUILD_SQL = [
+    'DELETE FROM revenue_rollup',
+    """INSERT INTO revenue_rollup (day, doctor_id, service_id, payment_status, invoice_count, amount_cents)
+    SELECT date(a.start) AS day, a.doctor_id, i.service_id, i.payment_status,
+        count(*) AS invoice_count, sum(i.amount_cents) AS amount_cents
+    FROM invoice i JOIN appointment a ON a.appointment_id = i.appointment_id
+    GROUP BY day, doctor_id, service_id, payment_status""",
+]
+
+
+# revision identifiers, used by Alembic.
+revision = 'af897d63e809'
+down_revision = '6c1f2a9d4e10'
+branch_labels = None
+depends_on = None
+
+
+def _read(table, pk, column):
+    t = sa.table(table, sa.column(pk), sa.column(column))
+    return op.get_bind().execute(sa.select(t.c[pk], t.c[column])).all()
+
+
+def _write(table, pk, column, values):
+    conn = op.get_bind()
+    t = sa.table(table, sa.column(pk), sa.column(column))
+    for key, value in values.items():
+        conn.execute(t.update().where(t.c[pk] == key).values({column: value}))
+
+
+def _convert(table, pk, source, target, convert):
+    _write(table, pk, target, {key: convert(value) for key, value in _read(table, pk, source)})
+
+
+def _parse_money(table, pk, column, bad):
+    cents = {}
+    for key, value in _read(table, pk, column):
+        try:
+            cents[key] = parse_cents(value)
+        except ValueError:
+            bad.append(f'  {table} {key}: {value!r}')
+    return cents
+
+
+def upgrade():
+    # Parse everything before touching the schema: SQLite DDL is not
+    # transactional, so failing half way would leave the new columns behind.
+    bad = []
+    invoice_cents = _parse_money('invoice', 'invoice_id', 'amount', bad)
+    service_cents = _parse_money('service', 'service_id', 'fee', bad)
+    if bad:
+        raise RuntimeError(f'{len(bad)} money amounts could not be read; '
+                           'fix them and re-run the upgrade:\n' + '\n'.join(bad[:50]))
+
+    op.create_table('revenue_rollup',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('doctor_id', sa.Integer(), nullable=False),
+    sa.Column('service_id', sa.Integer(), nullable=False),
+    sa.Column('payment_status', sa.String(length=20), nullable=False),
+    sa.Column('invoice_count', sa.Integer(), nullable=False),
+    sa.Column('amount_cents', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'doctor_id', 'service_id', 'payment_status')
+    )
+
+    with op.batch_alter_table('invoice', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('amount_cents', sa.Integer(), nullable=True))
+    with op.batch_alter_table('service', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fee_cents', sa.Integer(), nullable=True))
+
+    _write('invoice', 'invoice_id', 'amount_cents', invoice_cents)
+    _write('service', 'service_id', 'fee_cents', service_cents)
+
+    with op.batch_alter_table('invoice', schema=None) as batch_op:
+        batch_op.alter_column('amount_cents', existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_column('amount')
+    with op.batch_alter_table('service', schema=None) as batch_op:
+        batch_op.alter_column('fee_cents', existing_type=sa.Integer(), nullable=False)
+        batch_op.drop_column('fee')
+
+    for statement in ROLLUP_TRIGGERS + REBUILD_SQL:
+        op.execute(statement)
+
+
+def downgrade():
+    for trigger in TRIGGER_NAMES:
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+
+    with op.batch_alter_table('service', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('fee', sa.VARCHAR(length=20), nullable=True))
+    with op.batch_alter_table('invoice', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('amount', sa.VARCHAR(length=20), nullable=True))
+
+    to_string = lambda cents: f'{cents / 100:.2f}'
+    _convert('service', 'service_id', 'fee_cents', 'fee', to_string)
+    _convert('invoice', 'invoice_id', 'amount_cents', 'amount', to_string)
+
+    with op.batch_alter_table('service', schema=None) as batch_op:
+        batch_op.alter_column('fee', existing_type=sa.VARCHAR(length=20), nullable=False)
+        batch_op.drop_column('fee_cents')
+    with op.batch_alter_table('invoice', schema=None) as batch_op:
+        batch_op.alter_column('amount', existing_type=sa.VARCHAR(length=20), nullable=False)
+        batch_op.drop_column('amount_cents')
+
+    op.drop_table('revenue_rollup')
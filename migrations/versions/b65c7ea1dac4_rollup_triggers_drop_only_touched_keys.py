@@ -0,0 +1,118 @@
+"""rollup triggers drop only touched keys
+
+Revision ID: b65c7ea1dac4
+Revises: aafd7bd8d521
+Create Date: 2026-10-17 19:00:12.093876
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# Frozen copies of billing.py's SQL at this revision; a later change to the
+# triggers gets a revision of its own.
+TRIGGER_NAMES = ['invoice_rollup_ai', 'invoice_rollup_au', 'invoice_rollup_ad',
+                 'appointment_rollup_au', 'appointment_rollup_ad']
+
+ROLLUP_TRIGGERS = [
+    """CREATE TRIGGER IF NOT EXISTS invoice_rollup_ai AFTER INSERT ON invoice BEGIN
+        INSERT INTO revenue_rollup (day, doctor_id, service_id, payment_status, invoice_count, amount_cents)
+        SELECT date(a.start), a.doctor_id, NEW.service_id, NEW.payment_status, 1, NEW.amount_cents
+        FROM appointment a WHERE a.appointment_id = NEW.appointment_id
+        ON CONFLICT (day, doctor_id, service_id, payment_status) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            amount_cents = amount_cents + excluded.amount_cents;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS invoice_rollup_au
+        AFTER UPDATE OF appointment_id, service_id, amount_cents, payment_status ON invoice BEGIN
+        INSERT INTO revenue_rollup (day, doctor_id, service_id, payment_status, invoice_count, amount_cents)
+        SELECT date(a.start), a.doctor_id, OLD.service_id, OLD.payment_status, -1, -OLD.amount_cents
+        FROM appointment a WHERE a.appointment_id = OLD.appointment_id
+        ON CONFLICT (day, doctor_id, service_id, payment_status) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            amount_cents = amount_cents + excluded.amount_cents;
+        INSERT INTO revenue_rollup (day, doctor_id, service_id, payment_status, invoice_count, amount_cents)
+        SELECT date(a.start), a.doctor_id, NEW.service_id, NEW.payment_status, 1, NEW.amount_cents
+        FROM appointment a WHERE a.appointment_id = NEW.appointment_id
+        ON CONFLICT (day, doctor_id, service_id, payment_status) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            amount_cents = amount_cents + excluded.amount_cents;
+        DELETE FROM revenue_rollup WHERE invoice_count = 0
+        AND (day, doctor_id, service_id, payment_status) IN (
+            SELECT date(a.start), a.doctor_id, OLD.service_id, OLD.payment_status
+            FROM appointment a WHERE a.appointment_id = OLD.appointment_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS invoice_rollup_ad AFTER DELETE ON invoice BEGIN
+        INSERT INTO revenue_rollup (day, doctor_id, service_id, payment_status, invoice_count, amount_cents)
+        SELECT date(a.start), a.doctor_id, OLD.service_id, OLD.payment_status, -1, -OLD.amount_cents
+        FROM appointment a WHERE a.appointment_id = OLD.appointment_id
+        ON CONFLICT (day, doctor_id, service_id, payment_status) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            amount_cents = amount_cents + excluded.amount_cents;
+        DELETE FROM revenue_rollup WHERE invoice_count = 0
+        AND (day, doctor_id, service_id, payment_status) IN (
+            SELECT date(a.start), a.doctor_id, OLD.service_id, OLD.payment_status
+            FROM appointment a WHERE a.appointment_id = OLD.appointment_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS appointment_rollup_au AFTER UPDATE OF start, doctor_id ON appointment BEGIN
+        INSERT INTO revenue_rollup (day, doctor_id, service_id, payment_status, invoice_count, amount_cents)
+        SELECT date(OLD.start), OLD.doctor_id, service_id, payment_status, -count(*), -sum(amount_cents)
+        FROM invoice WHERE appointment_id = OLD.appointment_id GROUP BY service_id, payment_status
+        ON CONFLICT (day, doctor_id, service_id, payment_status) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            amount_cents = amount_cents + excluded.amount_cents;
+        INSERT INTO revenue_rollup (day, doctor_id, service_id, payment_status, invoice_count, amount_cents)
+        SELECT date(NEW.start), NEW.doctor_id, service_id, payment_status, count(*), sum(amount_cents)
+            FROM invoice WHERE appointment_id = NEW.appointment_id GROUP BY service_id, payment_status
+        ON CONFLICT (day, doctor_id, service_id, payment_status) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            amount_cents = amount_cents + excluded.amount_cents;
+        DELETE FROM revenue_rollup WHERE invoice_count = 0
+        AND (day, doctor_id, service_id, payment_status) IN (
+            SELECT date(OLD.start), OLD.doctor_id, service_id, payment_status
+            FROM invoice WHERE appointment_id = OLD.appointment_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS appointment_rollup_ad AFTER DELETE ON appointment BEGIN
+        INSERT INTO revenue_rollup (day, doctor_id, service_id, payment_status, invoice_count, amount_cents)
+        SELECT date(OLD.start), OLD.doctor_id, service_id, payment_status, -count(*), -sum(amount_cents)
+        FROM invoice WHERE appointment_id = OLD.appointment_id GROUP BY service_id, payment_status
+        ON CONFLICT (day, doctor_id, service_id, payment_status) DO UPDATE SET
+            invoice_count = invoice_count + excluded.invoice_count,
+            amount_cents = amount_cents + excluded.amount_cents;
+        DELETE FROM revenue_rollup WHERE invoice_count = 0
+        AND (day, doctor_id, service_id, payment_status) IN (
+            SELECT date(OLD.start), OLD.doctor_id, service_id, payment_status
+            FROM invoice WHERE appointment_id = OLD.appointment_id);
+    END""",
+]
+
+REBUILD_SQL = [
+    'DELETE FROM revenue_rollup',
+    """INSERT INTO revenue_rollup (day, doctor_id, service_id, payment_status, invoice_count, amount_cents)
+    SELECT date(a.start) AS day, a.doctor_id, i.service_id, i.payment_status,
+        count(*) AS invoice_count, sum(i.amount_cents) AS amount_cents
+    FROM invoice i JOIN appointment a ON a.appointment_id = i.appointment_id
+    GROUP BY day, doctor_id, service_id, payment_status""",
+]
+
+
+# revision identifiers, used by Alembic.
+revision = 'b65c7ea1dac4'
+down_revision = 'aafd7bd8d521'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE TRIGGER IF NOT EXISTS would keep the old bodies, so replace them.
+    # The rebuild clears rows left behind by appointments deleted before
+    # appointment_rollup_ad existed.
+    for trigger in TRIGGER_NAMES:
+        op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+    for statement in ROLLUP_TRIGGERS + REBUILD_SQL:
+        op.execute(statement)
+
+
+def downgrade():
+    # The scoped cleanup in the other triggers is compatible with the older
+    # revisions, so only the trigger this revision added is removed.
+    op.execute('DROP TRIGGER IF EXISTS appointment_rollup_ad')
@@ -0,0 +1,86 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+_CONTEXT = multiprocessing.get_context(
+    'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn')
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool is saturated or a call times out."""
+
+
+class PasswordHasher:
+    """Runs password hashing in a bounded process pool.
+
+    ``method`` is any Werkzeug method string. Werkzeug writes short names
+    such as ``scrypt`` out in full (``scrypt:32768:8:1``), so the prefix of a
+    throwaway hash is kept and stored hashes are compared against that to
+    decide when to rehash. With ``workers=0`` hashing runs inline in the
+    calling thread.
+    """
+
+    def __init__(self, method, workers=2, max_pending=16, timeout=5.0):
+        self.method = method
+        self.prefix = generate_password_hash('', method).split('$', 1)[0]
+        self.workers = workers
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        # Created on first use so each gunicorn worker gets its own pool after
+        # fork. Children come from a forkserver rather than a fork of this
+        # threaded worker, which could copy a lock another thread holds and
+        # leave a child hung instead of dead.
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_CONTEXT)
+        return self._pool
+
+    def _discard_pool(self, pool):
+        # A child that died (OOM kill, SIGKILL) breaks the whole executor; the
+        # next call starts a fresh one.
+        with self._pool_lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, fn, *args):
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.timeout):
+            raise HasherBusy('Too many password hashes pending')
+        try:
+            pool = self._get_pool()
+            try:
+                future = pool.submit(fn, *args)
+                return future.result(timeout=self.timeout)
+            except TimeoutError:
+                future.cancel()
+                raise HasherBusy('Password hashing timed out') from None
+            except BrokenProcessPool:
+                self._discard_pool(pool)
+                raise HasherBusy('Password hashing pool restarted') from None
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        return pwhash.split('$', 1)[0] != self.prefix
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,136 @@
+from sqlalchemy import DDL, event, text
+
+# One row per medical record, rowid = record_id. Prescriptions are folded
+# into the ``medications`` column so a drug search finds the record.
+SEARCH_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS record_search USING fts5(
+        diagnosis, notes, medications,
+        patient_id UNINDEXED, doctor_id UNINDEXED,
+        tokenize = 'porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS record_search_ai AFTER INSERT ON medical_record BEGIN
+        INSERT INTO record_search (rowid, diagnosis, notes, medications, patient_id, doctor_id)
+        VALUES (NEW.record_id, NEW.diagnosis, NEW.notes,
+                (SELECT group_concat(medication_name, ' ') FROM prescription WHERE record_id = NEW.record_id),
+                NEW.patient_id, NEW.doctor_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS record_search_au AFTER UPDATE ON medical_record BEGIN
+        DELETE FROM record_search WHERE rowid = OLD.record_id;
+        INSERT INTO record_search (rowid, diagnosis, notes, medications, patient_id, doctor_id)
+        VALUES (NEW.record_id, NEW.diagnosis, NEW.notes,
+                (SELECT group_concat(medication_name, ' ') FROM prescription WHERE record_id = NEW.record_id),
+                NEW.patient_id, NEW.doctor_id);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS record_search_ad AFTER DELETE ON medical_record BEGIN
+        DELETE FROM record_search WHERE rowid = OLD.record_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS prescription_search_ai AFTER INSERT ON prescription BEGIN
+        UPDATE record_search
+        SET medications = (SELECT group_concat(medication_name, ' ') FROM prescription WHERE record_id = NEW.record_id)
+        WHERE rowid = NEW.record_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS prescription_search_au AFTER UPDATE ON prescription BEGIN
+        UPDATE record_search
+        SET medications = (SELECT group_concat(medication_name, ' ') FROM prescription WHERE record_id = OLD.record_id)
+        WHERE rowid = OLD.record_id;
+        UPDATE record_search
+        SET medications = (SELECT group_concat(medication_name, ' ') FROM prescription WHERE record_id = NEW.record_id)
+        WHERE rowid = NEW.record_id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS prescription_search_ad AFTER DELETE ON prescription BEGIN
+        UPDATE record_search
+        SET medications = (SELECT group_concat(medication_name, ' ') FROM prescription WHERE record_id = OLD.record_id)
+        WHERE rowid = OLD.record_id;
+    END""",
+]
+
+REBUILD_SQL = [
+    "DELETE FROM record_search",
+    """INSERT INTO record_search (rowid, diagnosis, notes, medications, patient_id, doctor_id)
+       SELECT r.record_id, r.diagnosis, r.notes, group_concat(p.medication_name, ' '), r.patient_id, r.doctor_id
+       FROM medical_record r LEFT JOIN prescription p ON p.record_id = r.record_id
+       GROUP BY r.record_id""",
+    "INSERT INTO record_search (record_search) VALUES ('optimize')",
+]
+
+
+def install(table):
+    """Create the index and its triggers whenever ``table`` is created by create_all."""
+    for statement in SEARCH_DDL:
+        event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+
+def rebuild(session):
+    for statement in REBUILD_SQL:
+        session.execute(text(statement))
+    session.commit()
+
+
+def match_expression(query):
+    """Turn free text into an FTS5 query that ANDs each quoted term.
+
+    Quoting keeps user input from being parsed as FTS5 syntax; a trailing
+    ``*`` on a term is kept as a prefix search.
+    """
+    terms = []
+    for word in query.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*').replace('"', '""')
+        if word:
+            terms.append(f'"{word}"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+
+def search_records(session, query, patient_id=None, doctor_id=None, after=None, limit=20, max_candidates=None):
+    """Return one page of records ranked by bm25, plus the cursor for the next page.
+
+    ``after`` is the ``(rank, record_id)`` of the last row already seen. The
+    keyset saves re-sending earlier rows, but ordering by rank still scores
+    every candidate on every page, so a page costs as much as the candidate
+    set is large. Given ``max_candidates``, searches outside one patient's
+    chart rank only that many of the newest matches; a common term would
+    otherwise mean scoring a large share of the table on every page.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return [], None
+
+    clauses = ['record_search MATCH :q']
+    params = {'q': expression, 'limit': limit + 1}
+    if patient_id is not None:
+        # A patient has few records, so probing the index by rowid beats
+        # filtering every match on the UNINDEXED column. A doctor has too
+        # many records for that to pay off.
+        clauses.append('s.rowid IN (SELECT record_id FROM medical_record WHERE patient_id = :patient_id)')
+        params['patient_id'] = patient_id
+    elif max_candidates is not None:
+        # FTS5 walks a match in rowid order without scoring it, so finding
+        # the oldest of the newest candidates is cheap; the rowid range then
+        # limits what the ranked query scores.
+        doctor_filter = 'AND doctor_id = :doctor_id' if doctor_id is not None else ''
+        clauses.append(f"""s.rowid >= coalesce((SELECT rowid FROM record_search
+            WHERE record_search MATCH :q {doctor_filter}
+            ORDER BY rowid DESC LIMIT 1 OFFSET :max_candidates - 1), 0)""")
+        params['max_candidates'] = max_candidates
+    if doctor_id is not None:
+        clauses.append('s.doctor_id = :doctor_id')
+        params['doctor_id'] = doctor_id
+    if after is not None:
+        clauses.append('(s.rank > :after_rank OR (s.rank = :after_rank AND s.rowid > :after_id))')
+        params['after_rank'], params['after_id'] = after
+
+    rows = session.execute(text(f"""
+        SELECT s.rowid AS record_id, s.rank AS rank, s.patient_id, s.doctor_id,
+               r.visit_date, r.diagnosis,
+               snippet(record_search, -1, '[', ']', '...', 12) AS snippet
+        FROM record_search s JOIN medical_record r ON r.record_id = s.rowid
+        WHERE {' AND '.join(clauses)}
+        ORDER BY s.rank, s.rowid
+        LIMIT :limit
+    """), params).mappings().all()
+
+    cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = (rows[-1]['rank'], rows[-1]['record_id'])
+    return [dict(row) for row in rows], cursor
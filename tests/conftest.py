@@ -0,0 +1,57 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+# clinic reads its configuration at import time.
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ['IDENTITY_CACHE_BACKEND'] = 'memory'
+os.environ['DASHBOARD_CACHE_BACKEND'] = 'memory'
+os.environ['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256:1000'
+os.environ['PASSWORD_POOL_WORKERS'] = '0'
+
+import clinic  # noqa: E402
+from clinic import (app, db, Account, Patient, Doctor, Appointment, MedicalRecord, Prescription,  # noqa: E402
+                    Service, Invoice)
+
+PATIENT_EMAIL = 'patient@example.com'
+ROWS = 150
+
+
+@pytest.fixture(scope='session')
+def clinic_data():
+    """One patient with ROWS appointments and records, each with two children."""
+    with app.app_context():
+        password = clinic.password_hasher.hash('password')
+        db.session.add_all([
+            Account(account_id=1, firstname='Pat', lastname='Ient', email=PATIENT_EMAIL, phone='',
+                    birthdate='1990-01-01', password=password, role='patient'),
+            Account(account_id=2, firstname='Doc', lastname='Tor', email='doctor@example.com', phone='',
+                    birthdate='1980-01-01', password=password, role='doctor'),
+            Patient(patient_id=1, first_name='Pat', last_name='Ient', birthdate='1990-01-01', gender='F',
+                    contact_number='', account_id=1),
+            Doctor(doctor_id=1, first_name='Doc', last_name='Tor', specialization='Dentistry',
+                   contact_number='', account_id=2),
+            Service(service_id=1, name='Cleaning', description='', fee_cents=5000),
+        ])
+        start = datetime(2025, 1, 6, 9)
+        for i in range(1, ROWS + 1):
+            db.session.add(Appointment(appointment_id=i, patient_id=1, doctor_id=1, status='scheduled',
+                                       start=start + timedelta(days=i), end=start + timedelta(days=i, minutes=30)))
+            db.session.add_all([Invoice(appointment_id=i, service_id=1, amount_cents=5000, payment_status='paid')
+                                for _ in range(2)])
+            db.session.add(MedicalRecord(record_id=i, patient_id=1, doctor_id=1, visit_date='2025-01-01',
+                                         diagnosis='gingivitis', notes=''))
+            db.session.add_all([Prescription(record_id=i, medication_name='ibuprofen', dosage='200mg',
+                                             instructions='') for _ in range(2)])
+        db.session.commit()
+    return ROWS
+
+
+@pytest.fixture
+def patient_client(clinic_data):
+    client = app.test_client()
+    response = client.post('/', data={'email': PATIENT_EMAIL, 'password': 'password', 'role': 'patient'})
+    assert response.status_code == 302
+    return client
@@ -0,0 +1,132 @@
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+from flask_restx import marshal
+from sqlalchemy import event
+
+import clinic
+from clinic import app, db, Appointment
+
+APPOINTMENTS = '/api/v1/patients/1/appointments'
+RECORDS = '/api/v1/patients/1/records'
+PRESCRIPTIONS = '/api/v1/patients/1/prescriptions'
+
+# (url, field mask, statements per page). None asks for every field.
+CASES = [
+    (APPOINTMENTS, None, 2),
+    (APPOINTMENTS, 'appointment_id,start,status', 1),
+    (APPOINTMENTS, 'appointment_id,doctor_name', 1),
+    (APPOINTMENTS, 'appointment_id,invoices{amount_cents}', 2),
+    (RECORDS, None, 2),
+    (RECORDS, 'record_id,diagnosis', 1),
+    (RECORDS, 'record_id,doctor_name', 1),
+    (RECORDS, 'record_id,prescriptions{medication_name}', 2),
+    (PRESCRIPTIONS, None, 1),
+    (PRESCRIPTIONS, 'prescription_id,medication_name', 1),
+    (PRESCRIPTIONS, 'prescription_id,visit_date', 1),
+]
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def get_page(client, url, limit, mask=None, **params):
+    params['limit'] = limit
+    if mask is not None:
+        params['fields'] = mask
+    return client.get(url, query_string=params)
+
+
+@pytest.mark.parametrize('url, mask, expected', CASES)
+@pytest.mark.parametrize('limit', [1, 10, 100])
+def test_statements_per_page_do_not_grow_with_page_size(patient_client, url, mask, expected, limit):
+    # The first request fills the identity cache so only the page itself is counted.
+    get_page(patient_client, url, 1, mask)
+
+    with count_statements() as statements:
+        response = get_page(patient_client, url, limit, mask)
+
+    assert response.status_code == 200
+    items = response.get_json()['items']
+    assert len(items) == limit
+    if mask is not None:
+        assert set(items[0]) == {field.split('{')[0] for field in mask.split(',')}
+    assert len(statements) == expected, statements
+
+
+@pytest.mark.parametrize('url, key', [(APPOINTMENTS, 'appointment_id'), (RECORDS, 'record_id'),
+                                      (PRESCRIPTIONS, 'prescription_id')])
+def test_cursor_walks_every_item_once(patient_client, clinic_data, url, key):
+    seen, cursor = [], None
+    while True:
+        params = {'cursor': cursor} if cursor else {}
+        body = get_page(patient_client, url, 40, **params).get_json()
+        seen.extend(body['items'])
+        cursor = body['next_cursor']
+        if cursor is None:
+            break
+    ids = [item[key] for item in seen]
+    # Prescriptions come two per record.
+    assert len(ids) == len(set(ids)) == clinic_data * (2 if url == PRESCRIPTIONS else 1)
+
+
+def test_unchanged_page_returns_304(patient_client):
+    response = get_page(patient_client, APPOINTMENTS, 10)
+    etag = response.headers['ETag']
+
+    again = patient_client.get(APPOINTMENTS, query_string={'limit': 10}, headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+
+    other_page = patient_client.get(APPOINTMENTS, query_string={'limit': 11}, headers={'If-None-Match': etag})
+    assert other_page.status_code == 200
+
+
+def test_changed_page_gets_a_new_etag(patient_client):
+    etag = get_page(patient_client, APPOINTMENTS, 5).headers['ETag']
+    with app.app_context():
+        appointment = db.session.get(Appointment, 1)
+        appointment.status = 'cancelled'
+        db.session.commit()
+    try:
+        response = patient_client.get(APPOINTMENTS, query_string={'limit': 5}, headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.get_json()['items'][0]['status'] == 'cancelled'
+    finally:
+        with app.app_context():
+            db.session.get(Appointment, 1).status = 'scheduled'
+            db.session.commit()
+
+
+@pytest.mark.parametrize('mask', ['appointment_id{', 'appointment_id,nonexistent', 'start{year}',
+                                  'invoices{nonexistent}'])
+def test_invalid_mask_is_rejected(patient_client, mask):
+    assert get_page(patient_client, APPOINTMENTS, 5, mask).status_code == 400
+
+
+def test_invalid_cursor_is_rejected(patient_client):
+    assert get_page(patient_client, APPOINTMENTS, 5, cursor='not-a-cursor').status_code == 400
+
+
+def test_patient_cannot_read_another_chart(patient_client):
+    assert patient_client.get('/api/v1/patients/2/appointments').status_code == 403
+
+
+def test_missing_doctor_does_not_fail_the_page():
+    appointment = Appointment(appointment_id=1, doctor_id=99, start=datetime(2025, 1, 1, 9),
+                              end=datetime(2025, 1, 1, 9, 30), status='scheduled')
+    assert marshal(appointment, clinic.appointment_fields)['doctor_name'] is None
@@ -0,0 +1,96 @@
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+import billing
+from billing import parse_cents
+from clinic import app, db, Account, Appointment, Doctor, Invoice, Service
+
+
+@pytest.mark.parametrize('value, cents', [
+    ('$1,234.50', 123450),
+    ('1,234,567', 123456700),
+    ('-$5', -500),
+    ('$-5', -500),
+    ('(5.00)', -500),
+    ('PHP 500', 50000),
+    ('500 PHP', 50000),
+    ('12.3', 1230),
+    ('.5', 50),
+    ('0.01', 1),
+])
+def test_parse_cents(value, cents):
+    assert parse_cents(value) == cents
+
+
+@pytest.mark.parametrize('value', ['1.005', '12,34', '1,2345', ',123', '1,,234', '-$-5', '(-5)', 'abc', ''])
+def test_parse_cents_rejects_ambiguous_amounts(value):
+    with pytest.raises(ValueError, match='Not a money amount'):
+        parse_cents(value)
+
+
+@pytest.fixture
+def rollup_rows(clinic_data):
+    """A second doctor and service, and the appointment ids the test may use."""
+    ids = range(900, 940)
+    with app.app_context():
+        db.session.add_all([
+            Account(account_id=90, firstname='Sec', lastname='Ond', email='second@example.com', phone='',
+                    birthdate='1980-01-01', password='', role='doctor'),
+            Doctor(doctor_id=90, first_name='Sec', last_name='Ond', specialization='Orthodontics',
+                   contact_number='', account_id=90),
+            Service(service_id=90, name='Braces', description='', fee_cents=90000),
+        ])
+        db.session.commit()
+    yield ids
+    with app.app_context():
+        db.session.execute(db.delete(Invoice).where(Invoice.appointment_id.in_(ids)))
+        db.session.execute(db.delete(Appointment).where(Appointment.appointment_id.in_(ids)))
+        db.session.delete(db.session.get(Service, 90))
+        db.session.delete(db.session.get(Doctor, 90))
+        db.session.delete(db.session.get(Account, 90))
+        db.session.commit()
+        assert billing.reconcile(db.session) == []
+
+
+def test_triggers_keep_the_rollup_in_step(rollup_rows):
+    rng = random.Random(7)
+    days = [datetime(2025, 3, 3, 9) + timedelta(days=n) for n in range(4)]
+    with app.app_context():
+        for step in range(300):
+            appointments = db.session.scalars(
+                db.select(Appointment).where(Appointment.appointment_id.in_(rollup_rows))).all()
+            invoices = [invoice for appointment in appointments for invoice in appointment.invoices]
+            unused = sorted(set(rollup_rows) - {appointment.appointment_id for appointment in appointments})
+            action = rng.random()
+            if (action < 0.2 or not appointments) and unused:
+                start = rng.choice(days)
+                db.session.add(Appointment(appointment_id=rng.choice(unused), patient_id=1,
+                                           doctor_id=rng.choice([1, 90]), status='scheduled',
+                                           start=start, end=start + timedelta(minutes=30)))
+            elif action < 0.45:
+                db.session.add(Invoice(appointment_id=rng.choice(appointments).appointment_id,
+                                       service_id=rng.choice([1, 90]), amount_cents=rng.randint(0, 10000),
+                                       payment_status=rng.choice(['paid', 'pending'])))
+            elif action < 0.65 and invoices:
+                invoice = rng.choice(invoices)
+                invoice.appointment_id = rng.choice(appointments).appointment_id
+                invoice.service_id = rng.choice([1, 90])
+                invoice.amount_cents = rng.randint(0, 10000)
+                invoice.payment_status = rng.choice(['paid', 'pending'])
+            elif action < 0.75 and invoices:
+                db.session.delete(rng.choice(invoices))
+            elif action < 0.9:
+                appointment = rng.choice(appointments)
+                appointment.start = rng.choice(days) + timedelta(hours=rng.randint(0, 7))
+                appointment.doctor_id = rng.choice([1, 90])
+            else:
+                # Foreign keys are enforced, so an appointment goes after its invoices.
+                appointment = rng.choice(appointments)
+                for invoice in appointment.invoices:
+                    db.session.delete(invoice)
+                db.session.flush()
+                db.session.delete(appointment)
+            db.session.commit()
+            assert billing.reconcile(db.session) == [], f'rollup out of step after step {step}'
@@ -0,0 +1,120 @@
+import random
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from clinic import (app, db, book_appointment, check_bookable, load_schedules, Account, Appointment,
+                    DoctorSchedule, Patient)
+
+DAY = date(2025, 1, 6)
+# Far enough ahead to stay bookable, and a Monday so no test depends on weekday rules.
+FUTURE = date.today() + timedelta(days=63 - date.today().weekday())
+
+
+def at(hour, minute=0, day=DAY):
+    return datetime.combine(day, datetime.min.time()).replace(hour=hour, minute=minute)
+
+
+def free(schedule):
+    return [f'{slot:%H:%M}' for slot in schedule.free_slots(DAY)]
+
+
+def test_nested_interval_is_not_reported_free():
+    schedule = DoctorSchedule()
+    schedule.add(at(9), at(11))
+    schedule.add(at(9, 30), at(10))
+    assert free(schedule)[0] == '11:00'
+    assert schedule.overlaps(at(10), at(10, 30))
+
+
+def test_adjacent_appointments_leave_their_neighbours_free():
+    schedule = DoctorSchedule()
+    schedule.add(at(10), at(10, 30))
+    schedule.add(at(9, 30), at(10))
+    assert not schedule.overlaps(at(9), at(9, 30))
+    assert not schedule.overlaps(at(10, 30), at(11))
+    assert free(schedule)[:3] == ['09:00', '10:30', '11:00']
+
+
+def test_overlaps_matches_a_pairwise_check():
+    rng = random.Random(1)
+    slot = timedelta(minutes=30)
+    for _ in range(500):
+        schedule, intervals = DoctorSchedule(), []
+        for _ in range(rng.randint(0, 8)):
+            start = at(9) + slot * rng.randint(0, 15)
+            end = start + slot * rng.randint(1, 4)
+            schedule.add(start, end)
+            intervals.append((start, end))
+        for k in range(16):
+            start = at(9) + slot * k
+            expected = any(a < start + slot and b > start for a, b in intervals)
+            assert schedule.overlaps(start, start + slot) is expected
+
+
+@pytest.mark.parametrize('start, end, message', [
+    (at(9, day=FUTURE).replace(tzinfo=timezone.utc), at(9, 30, day=FUTURE).replace(tzinfo=timezone.utc), 'UTC offset'),
+    (at(10, day=FUTURE), at(10, day=FUTURE), 'end after'),
+    (at(9, day=date.today() - timedelta(days=1)), at(9, 30, day=date.today() - timedelta(days=1)), 'past'),
+    (at(8, 30, day=FUTURE), at(9, day=FUTURE), 'between'),
+    (at(16, 30, day=FUTURE), at(17, 30, day=FUTURE), 'between'),
+    (at(9, 15, day=FUTURE), at(9, 45, day=FUTURE), 'slot grid'),
+    (at(9, day=FUTURE), at(9, 20, day=FUTURE), 'slot grid'),
+])
+def test_check_bookable_rejects(clinic_data, start, end, message):
+    with app.app_context(), pytest.raises(ValueError, match=message):
+        check_bookable(1, start, end)
+
+
+def test_check_bookable_rejects_an_unknown_doctor(clinic_data):
+    with app.app_context(), pytest.raises(ValueError, match='Unknown doctor 99'):
+        check_bookable(99, at(9, day=FUTURE), at(9, 30, day=FUTURE))
+
+
+@pytest.fixture
+def booking_patient(clinic_data):
+    """A patient of its own, so bookings here do not change patient 1's pages."""
+    with app.app_context():
+        db.session.add_all([
+            Account(account_id=80, firstname='Book', lastname='Er', email='booker@example.com', phone='',
+                    birthdate='1990-01-01', password='', role='patient'),
+            Patient(patient_id=80, first_name='Book', last_name='Er', birthdate='1990-01-01', gender='M',
+                    contact_number='', account_id=80),
+        ])
+        db.session.commit()
+    yield 80
+    with app.app_context():
+        db.session.execute(db.delete(Appointment).where(Appointment.patient_id == 80))
+        db.session.delete(db.session.get(Patient, 80))
+        db.session.delete(db.session.get(Account, 80))
+        db.session.commit()
+
+
+def book(hour, minute=0, minutes=30):
+    start = at(hour, minute, day=FUTURE)
+    with app.app_context():
+        appointment = book_appointment(80, 1, start, start + timedelta(minutes=minutes))
+        return appointment and appointment.appointment_id
+
+
+def test_booking_conflicts_and_adjacency(booking_patient):
+    assert book(9, minutes=120)
+    # Inside, straddling the end, and covering it are all taken.
+    assert book(9, 30) is None
+    assert book(10, 30, minutes=60) is None
+    assert book(9, minutes=180) is None
+    # Back to back is fine.
+    assert book(11)
+    with app.app_context():
+        schedule = load_schedules([1], at(9, day=FUTURE), at(17, day=FUTURE))[1]
+        free_slots = schedule.free_slots(FUTURE)
+    assert free_slots[0] == at(11, 30, day=FUTURE)
+    assert len(free_slots) == 16 - 5
+
+
+def test_cancelled_appointment_frees_its_slot(booking_patient):
+    first = book(14)
+    with app.app_context():
+        db.session.get(Appointment, first).status = 'cancelled'
+        db.session.commit()
+    assert book(14)
@@ -0,0 +1,120 @@
+import io
+import json
+from datetime import datetime
+
+import pytest
+
+import clinic
+from bulk import coerce_row, import_rows, read_rows
+from clinic import app, db, Account, Appointment, MedicalRecord, Patient, Prescription
+
+
+def jsonl(*rows):
+    return io.StringIO(''.join((row if isinstance(row, str) else json.dumps(row)) + '\n' for row in rows))
+
+
+def record(**values):
+    return {'patient_id': 1, 'doctor_id': 1, 'visit_date': '2025-02-01', 'diagnosis': 'caries',
+            'notes': 'filled', **values}
+
+
+def test_coerce_keeps_empty_text():
+    row = coerce_row(MedicalRecord.__table__, record(notes=''))
+    assert row['notes'] == ''
+    assert row['record_id'] is None
+
+
+@pytest.mark.parametrize('column, value', [('notes', None), ('patient_id', ''), ('doctor_id', None)])
+def test_coerce_rejects_missing_values(column, value):
+    with pytest.raises(ValueError, match=f'missing {column}'):
+        coerce_row(MedicalRecord.__table__, record(**{column: value}))
+
+
+def test_coerce_treats_an_absent_column_as_missing():
+    raw = record()
+    del raw['diagnosis']
+    with pytest.raises(ValueError, match='missing diagnosis'):
+        coerce_row(MedicalRecord.__table__, raw)
+
+
+def test_coerce_converts_types_and_keeps_source_ids():
+    row = coerce_row(Appointment.__table__, {'appointment_id': '7', 'patient_id': '1', 'doctor_id': '1',
+                                             'start': '2025-03-01T09:00:00', 'end': '2025-03-01T09:30:00',
+                                             'status': 'scheduled'})
+    assert row['appointment_id'] == 7
+    assert row['start'] == datetime(2025, 3, 1, 9)
+
+
+def test_csv_empty_cells_are_text_or_null():
+    source = io.StringIO('patient_id,doctor_id,visit_date,diagnosis,notes,record_id\n1,1,2025-02-01,caries,,\n')
+    [(line_no, raw, error)] = read_rows(source, 'csv')
+    row = coerce_row(MedicalRecord.__table__, raw)
+    assert (line_no, error, row['notes'], row['record_id']) == (2, None, '', None)
+
+
+def test_import_rejects_only_bad_rows(clinic_data):
+    errors = []
+    with app.app_context():
+        inserted, rejected = import_rows(
+            db.session, MedicalRecord.__table__,
+            read_rows(jsonl(record(record_id=1001), '{not json', record(record_id=1002, patient_id=999),
+                            record(record_id=1001), record(record_id=1003, notes='')), 'jsonl'),
+            chunk_size=10, on_error=lambda line_no, reason: errors.append((line_no, reason)))
+        notes = db.session.scalar(db.select(MedicalRecord.notes).where(MedicalRecord.record_id == 1003))
+        db.session.execute(db.delete(MedicalRecord).where(MedicalRecord.record_id.in_([1001, 1003])))
+        db.session.commit()
+    assert (inserted, rejected) == (2, 3)
+    assert [line_no for line_no, _ in errors] == [2, 3, 4]
+    assert 'invalid JSON' in errors[0][1]
+    assert errors[1][1] == 'unknown patient_id 999'
+    assert 'UNIQUE' in errors[2][1]
+    assert notes == ''
+
+
+def test_import_resolves_doctor_email(clinic_data, tmp_path):
+    source = tmp_path / 'records.jsonl'
+    source.write_text(json.dumps(record(record_id=1010, doctor_id=None, doctor_email='doctor@example.com')) + '\n')
+    result = app.test_cli_runner().invoke(args=['import', 'records', str(source)])
+    assert 'Imported 1 records; rejected 0.' in result.output
+    with app.app_context():
+        assert db.session.get(MedicalRecord, 1010).doctor_id == 1
+        db.session.delete(db.session.get(MedicalRecord, 1010))
+        db.session.commit()
+
+
+def test_imported_patient_is_linked_at_once(clinic_data, tmp_path):
+    with app.app_context():
+        db.session.add(Account(account_id=60, firstname='New', lastname='Comer', email='new@example.com',
+                               phone='', birthdate='1990-01-01', password='', role='patient'))
+        db.session.commit()
+        # The account logs in before its patient row arrives.
+        assert clinic.load_user('60').patient_id is None
+
+    source = tmp_path / 'patients.csv'
+    source.write_text('patient_id,first_name,last_name,birthdate,gender,contact_number,account_email\n'
+                      '60,New,Comer,1990-01-01,F,,new@example.com\n')
+    result = app.test_cli_runner().invoke(args=['import', 'patients', str(source)])
+    assert 'Imported 1 patients; rejected 0.' in result.output
+
+    with app.app_context():
+        assert clinic.load_user('60').patient_id == 60
+        assert db.session.get(Patient, 60).contact_number == ''
+        db.session.delete(db.session.get(Patient, 60))
+        db.session.delete(db.session.get(Account, 60))
+        db.session.commit()
+
+
+def test_chart_export(clinic_data):
+    with app.app_context():
+        lines = [json.loads(line) for line in clinic.export_chart(1)]
+        prescriptions = db.session.scalar(db.select(db.func.count()).select_from(Prescription))
+    kinds = [line['type'] for line in lines]
+    # Parents come before their children.
+    assert kinds == sorted(kinds, key=['patient', 'appointment', 'medical_record', 'prescription',
+                                       'invoice'].index)
+    assert kinds.count('patient') == 1
+    assert kinds.count('appointment') == kinds.count('medical_record') == clinic_data
+    assert kinds.count('prescription') == prescriptions
+    assert kinds.count('invoice') == 2 * clinic_data
+    assert lines[1]['start'] == '2025-01-07T09:00:00'
+    assert all(line['type'] != 'patient' or line['patient_id'] == 1 for line in lines)
@@ -0,0 +1,87 @@
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from cache import SQLiteCache
+import clinic
+from clinic import app, db, pool_options, Appointment
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('sqlite://', {}),
+    ('sqlite:///:memory:', {}),
+    ('sqlite:////var/lib/clinic/clinic.db', {'pool_size': 5}),
+    ('postgresql://clinic@localhost/clinic', {'pool_size': 5}),
+])
+def test_pool_options_skip_in_memory_sqlite(url, expected):
+    assert pool_options(url, pool_size=5) == expected
+
+
+def test_foreign_keys_are_enforced():
+    # Startup ran the migrations on a pooled connection; it must come back enforcing.
+    with app.app_context():
+        db.session.add(Appointment(patient_id=999, doctor_id=999, status='scheduled',
+                                   start=datetime(2025, 1, 6, 9), end=datetime(2025, 1, 6, 9, 30)))
+        with pytest.raises(IntegrityError):
+            db.session.commit()
+        db.session.rollback()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_child_opens_its_own_connections(tmp_path):
+    # What gunicorn --preload does after the startup warm-up.
+    cache = SQLiteCache(str(tmp_path / 'cache.db'))
+    cache.set('key', 'parent')
+    with app.app_context():
+        db.session.execute(text('SELECT 1'))
+        db.session.remove()
+        assert db.engine.pool.checkedin() > 0
+
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        ok = False
+        try:
+            os.close(read_end)
+            with app.app_context():
+                ok = db.engine.pool.checkedin() == 0 and getattr(cache._local, 'conn', None) is None
+                db.session.execute(text('SELECT 1'))
+                db.session.remove()
+            ok = ok and cache.get('key') == 'parent'
+        finally:
+            os.write(write_end, b'1' if ok else b'0')
+            os._exit(0)
+    os.close(write_end)
+    result = os.read(read_end, 1)
+    os.close(read_end)
+    os.waitpid(pid, 0)
+    assert result == b'1'
+    assert cache.get('key') == 'parent'
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('sqlite:////srv/clinic/clinic.db', ('sqlite', '/srv/clinic/clinic.identity_cache.db')),
+    ('sqlite:///file:/srv/clinic/clinic.db?mode=ro&uri=true', ('sqlite', '/srv/clinic/clinic.identity_cache.db')),
+    ('sqlite://', ('memory', None)),
+    ('sqlite:///:memory:', ('memory', None)),
+])
+def test_cache_lives_beside_the_database(monkeypatch, url, expected):
+    monkeypatch.setitem(app.config, 'SQLALCHEMY_DATABASE_URI', url)
+    assert clinic.cache_location('sqlite', 'identity_cache') == expected
+
+
+def test_relative_database_keeps_its_cache_in_the_instance_folder(monkeypatch):
+    monkeypatch.setitem(app.config, 'SQLALCHEMY_DATABASE_URI', 'sqlite:///fernandez_clinic.db')
+    assert clinic.cache_location('sqlite', 'dashboard_cache') == (
+        'sqlite', os.path.join(app.instance_path, 'fernandez_clinic.dashboard_cache.db'))
+
+
+def test_server_databases_get_separate_caches(monkeypatch):
+    paths = set()
+    for url in ('postgresql://clinic@db1/clinic', 'postgresql://clinic@db2/clinic'):
+        monkeypatch.setitem(app.config, 'SQLALCHEMY_DATABASE_URI', url)
+        paths.add(clinic.cache_location('sqlite', 'identity_cache'))
+    assert len(paths) == 2
@@ -0,0 +1,90 @@
+import os
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import clinic
+import metrics
+from clinic import app, db
+
+
+def test_failed_statement_drops_its_timer():
+    with app.app_context():
+        with db.engine.connect() as connection:
+            for _ in range(3):
+                with pytest.raises(OperationalError):
+                    connection.execute(text('SELECT * FROM no_such_table'))
+            assert connection.info['metrics_query_start'] == []
+            connection.execute(text('SELECT 1'))
+            assert connection.info['metrics_query_start'] == []
+
+
+def test_metrics_are_not_served_without_a_token(monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', None)
+    assert app.test_client().get('/metrics').status_code == 404
+
+
+@pytest.mark.parametrize('headers, query, expected', [
+    ({}, {}, 403),
+    ({'Authorization': 'Bearer wrong'}, {}, 403),
+    ({'Authorization': 'Bearer s3cret'}, {}, 200),
+    ({}, {'token': 's3cret'}, 200),
+    ({'X-Forwarded-For': '127.0.0.1'}, {}, 403),
+])
+def test_metrics_need_the_token(monkeypatch, headers, query, expected):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 's3cret')
+    response = app.test_client().get('/metrics', headers=headers, query_string=query)
+    assert response.status_code == expected
+    if expected == 200:
+        assert b'identity_cache_hits_total' in response.data
+
+
+def test_streamed_export_is_timed_after_its_body(patient_client):
+    route = '/patients/<int:patient_id>/chart.jsonl'
+    before = metrics.request_queries.snapshot().get((route,), (0, 0))
+    response = patient_client.get('/patients/1/chart.jsonl')
+    assert metrics.request_queries.snapshot().get((route,), (0, 0)) == before
+    assert response.get_data().count(b'\n') > 1
+    response.close()
+    count, statements = metrics.request_queries.snapshot()[(route,)]
+    assert count == before[0] + 1
+    # One statement per table in the chart.
+    assert statements - before[1] == 5
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_shared_store_sums_every_worker(tmp_path):
+    counter = metrics.Counter('test_worker_events_total', 'Events seen by test workers.', labels=('kind',))
+    try:
+        store = metrics.SharedStore(str(tmp_path / 'metrics.db'))
+        counter.inc('a', amount=2)
+        store.publish(force=True)
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                # A forked worker starts from zero rather than repeating its parent's counts.
+                counter.inc('a', amount=3 if counter.dump() == [] else 100)
+                counter.inc('b')
+                store.publish(force=True)
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+        counter.inc('a')
+        body = metrics.render(store.collect())
+        assert 'test_worker_events_total{kind="a"} 6' in body
+        assert 'test_worker_events_total{kind="b"} 1' in body
+        # This process alone.
+        assert 'test_worker_events_total{kind="a"} 3' in metrics.render()
+    finally:
+        metrics._registry.remove(counter)
+
+
+def test_metrics_endpoint_reports_cache_lookups(monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 's3cret')
+    clinic.identity_cache.get('identity:missing')
+    body = app.test_client().get('/metrics', query_string={'token': 's3cret'}).get_data(as_text=True)
+    misses = [line for line in body.splitlines() if line.startswith('identity_cache_misses_total ')]
+    assert misses == [f'identity_cache_misses_total {clinic.identity_cache.misses}']
@@ -0,0 +1,78 @@
+import os
+import signal
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+import clinic
+from clinic import app, db, Account
+from passwords import HasherBusy, PasswordHasher
+
+
+@pytest.mark.parametrize('method, stored, expected', [
+    ('pbkdf2:sha256:1000', 'pbkdf2:sha256:1000', False),
+    ('pbkdf2:sha256:1000', 'pbkdf2:sha256:500', True),
+    ('pbkdf2:sha256:1000', 'scrypt', True),
+    # Werkzeug writes "scrypt" out as scrypt:32768:8:1.
+    ('scrypt', 'scrypt', False),
+    ('scrypt', 'scrypt:16384:8:1', True),
+])
+def test_needs_rehash(method, stored, expected):
+    hasher = PasswordHasher(method, workers=0)
+    assert hasher.needs_rehash(generate_password_hash('secret', stored)) is expected
+
+
+def test_pool_survives_a_dead_worker():
+    hasher = PasswordHasher('pbkdf2:sha256:1000', workers=1, timeout=30)
+    try:
+        assert hasher.verify(hasher.hash('secret'), 'secret')
+        for pid in hasher._pool._processes:
+            os.kill(pid, signal.SIGKILL)
+        with pytest.raises(HasherBusy):
+            hasher.hash('secret')
+        assert hasher.verify(hasher.hash('secret'), 'secret')
+    finally:
+        hasher.shutdown()
+
+
+@pytest.fixture
+def old_hash_account(clinic_data):
+    with app.app_context():
+        db.session.add(Account(account_id=70, firstname='Old', lastname='Hash', email='old@example.com',
+                               phone='', birthdate='1980-01-01', role='admin',
+                               password=generate_password_hash('secret', 'pbkdf2:sha256:500')))
+        db.session.commit()
+    yield 70
+    with app.app_context():
+        db.session.delete(db.session.get(Account, 70))
+        db.session.commit()
+
+
+def login(email='old@example.com', password='secret'):
+    return app.test_client().post('/', data={'email': email, 'password': password, 'role': 'admin'})
+
+
+def stored_password(account_id):
+    with app.app_context():
+        return db.session.get(Account, account_id).password
+
+
+def test_login_upgrades_an_old_hash(old_hash_account):
+    assert login().status_code == 302
+    stored = stored_password(old_hash_account)
+    assert stored.startswith(f"{app.config['PASSWORD_HASH_METHOD']}$")
+    assert login().status_code == 302
+
+
+def test_wrong_password_does_not_upgrade(old_hash_account):
+    assert login(password='wrong').status_code == 200
+    assert stored_password(old_hash_account).startswith('pbkdf2:sha256:500$')
+
+
+def test_busy_hasher_skips_the_upgrade(old_hash_account, monkeypatch):
+    def busy(password):
+        raise HasherBusy('Too many password hashes pending')
+
+    monkeypatch.setattr(clinic.password_hasher, 'hash', busy)
+    assert login().status_code == 302
+    assert stored_password(old_hash_account).startswith('pbkdf2:sha256:500$')
@@ -0,0 +1,76 @@
+import pytest
+
+import search
+from clinic import app, db, Prescription
+
+
+def find(query, **kwargs):
+    with app.app_context():
+        rows, _ = search.search_records(db.session, query, limit=100, **kwargs)
+    return [row['record_id'] for row in rows]
+
+
+@pytest.fixture
+def prescription(clinic_data):
+    with app.app_context():
+        added = Prescription(record_id=5, medication_name='amoxicillin', dosage='500mg', instructions='')
+        db.session.add(added)
+        db.session.commit()
+        prescription_id = added.prescription_id
+    yield prescription_id
+    with app.app_context():
+        db.session.execute(db.delete(Prescription).where(Prescription.prescription_id == prescription_id))
+        db.session.commit()
+
+
+def test_prescription_changes_reach_the_index(prescription):
+    assert find('amoxicillin') == [5]
+    # The record's other prescriptions stay searchable.
+    assert 5 in find('ibuprofen amoxicillin')
+
+    with app.app_context():
+        db.session.get(Prescription, prescription).medication_name = 'metronidazole'
+        db.session.commit()
+    assert find('amoxicillin') == []
+    assert find('metronidazole') == [5]
+
+    with app.app_context():
+        db.session.get(Prescription, prescription).record_id = 6
+        db.session.commit()
+    assert find('metronidazole') == [6]
+    assert 5 in find('ibuprofen')
+
+    with app.app_context():
+        db.session.delete(db.session.get(Prescription, prescription))
+        db.session.commit()
+    assert find('metronidazole') == []
+
+
+def test_cursor_walks_every_match_once(clinic_data):
+    seen, ranks, after = [], [], None
+    with app.app_context():
+        while True:
+            rows, after = search.search_records(db.session, 'gingivitis', patient_id=1, after=after, limit=40)
+            seen += [row['record_id'] for row in rows]
+            ranks += [(row['rank'], row['record_id']) for row in rows]
+            if after is None:
+                break
+    assert sorted(seen) == list(range(1, clinic_data + 1))
+    assert ranks == sorted(ranks)
+
+
+def test_search_route_pages_with_its_cursor(patient_client, clinic_data):
+    seen, cursor = [], ''
+    while cursor is not None:
+        response = patient_client.get('/records/search', query_string={'q': 'gingiv*', 'limit': 70, 'after': cursor})
+        assert response.status_code == 200
+        seen += [row['record_id'] for row in response.json['results']]
+        cursor = response.json['next']
+    assert sorted(seen) == list(range(1, clinic_data + 1))
+
+
+def test_unscoped_search_ranks_only_the_newest_matches(clinic_data):
+    assert sorted(find('gingivitis', max_candidates=10)) == list(range(clinic_data - 9, clinic_data + 1))
+    assert sorted(find('gingivitis', doctor_id=1, max_candidates=10)) == list(range(clinic_data - 9, clinic_data + 1))
+    assert find('gingivitis', doctor_id=2, max_candidates=10) == []
+    assert len(find('gingivitis', max_candidates=1000)) == 100